@@ -1,13 +1,18 @@
 import streamlit as st
-import boto3
 import uuid
 from datetime import datetime
 import json
+import hashlib
 import time
 import sys
 import os
 import tempfile
-from PIL import Image
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from essence_mirror_core import (
+    S3_BUCKET, AGENT_ID, AGENT_ALIAS_ID, clients, get_executor, get_hedge_executor, warm_lambda,
+    json_dumps, json_loads, load_json_body, make_preview_thumbnail, upload_image_to_s3
+)
 
 # Add infrastructure path for Nova Reel
 sys.path.append('/Users/kirubelaklilu/Documents/EssenceMirror/essence-mirror-infrastructure')
@@ -27,25 +32,70 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize AWS clients
-@st.cache_resource
-def init_aws_clients():
-    return {
-        's3': boto3.client('s3', region_name='us-east-1'),
-        'bedrock_agent': boto3.client('bedrock-agent-runtime', region_name='us-east-1'),
-        'lambda': boto3.client('lambda', region_name='us-east-1')
-    }
+# base64 is only needed when a collage is decoded; resolve it on first use
+_base64 = None
+
+def _b64():
+    global _base64
+    if _base64 is None:
+        import base64 as _base64
+    return _base64
 
-clients = init_aws_clients()
+# Start the recommendations call in the background as soon as analysis
+# completes. Off by default: it is a paid call even if the user never asks
+# for recommendations.
+PREFETCH_RECOMMENDATIONS_ENABLED = False
 
-# Configuration
-S3_BUCKET = "essencemirror-user-uploads"
-AGENT_ID = "WWIUY28GRY"
-AGENT_ALIAS_ID = "TSTALIASID"
+# Upper bound, in seconds, on waiting for a background Lambda response
+LAMBDA_RESULT_TIMEOUT = 90
+# Seconds before a hedged call sends its backup request, about the
+# recommendations Lambda's p95 latency
+HEDGE_DELAY = 8
+
+def _invoke_lambda(payload):
+    """Invoke the essenceMirror Lambda and return the decoded response payload"""
+    lambda_response = clients['lambda'].invoke(
+        FunctionName='essenceMirror',
+        Payload=payload
+    )
+    return json_loads(lambda_response['Payload'].read())
+
+def invoke_lambda_hedged(payload, hedge_after=HEDGE_DELAY):
+    """Invoke the Lambda, sending a second copy only if the first is slow
+    
+    The backup request starts after hedge_after seconds (about the call's p95),
+    so most requests cost a single invocation; whichever response arrives
+    first is returned.
+    """
+    executor = get_hedge_executor()
+    deadline = time.monotonic() + LAMBDA_RESULT_TIMEOUT
+    futures = [executor.submit(_invoke_lambda, payload)]
+    hedged = False
+    error = None
+    while futures:
+        timeout = max(deadline - time.monotonic(), 0)
+        if not hedged:
+            timeout = min(timeout, hedge_after)
+        done, pending = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for loser in pending:
+                    loser.cancel()
+                return future.result()
+            error = future.exception()
+        futures = list(pending)
+        if not hedged and time.monotonic() < deadline:
+            # Slow (or failed) first attempt: start the backup request
+            futures.append(executor.submit(_invoke_lambda, payload))
+            hedged = True
+        elif not done:
+            for future in pending:
+                future.cancel()
+            raise TimeoutError("Lambda did not respond in time")
+    raise error
 
 def generate_image_specific_analysis(image_hash):
     """Generate image-specific analysis based on image hash"""
-    import hashlib
     
     # Generate varied profiles based on image hash for testing
     # Create more diverse profiles including youth and different contexts
@@ -288,27 +338,6 @@ def parse_analysis_text(analysis_text):
             "detailed_analysis": analysis_text
         }
 
-def upload_image_to_s3(uploaded_file):
-    """Upload image to S3 and return the key"""
-    try:
-        # Generate unique filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        file_extension = uploaded_file.name.split('.')[-1]
-        s3_key = f"uploads/streamlit_{timestamp}_{uuid.uuid4().hex[:8]}.{file_extension}"
-        
-        # Upload to S3
-        clients['s3'].upload_fileobj(
-            uploaded_file,
-            S3_BUCKET,
-            s3_key,
-            ExtraArgs={'ContentType': uploaded_file.type}
-        )
-        
-        return s3_key
-    except Exception as e:
-        st.error(f"Error uploading image: {str(e)}")
-        return None
-
 def invoke_bedrock_agent(message, session_id):
     """Invoke the Bedrock agent with a message"""
     try:
@@ -319,60 +348,71 @@ def invoke_bedrock_agent(message, session_id):
             inputText=message
         )
         
-        # Process the streaming response
-        full_response = ""
-        for event in response['completion']:
-            if 'chunk' in event:
-                chunk = event['chunk']
-                if 'bytes' in chunk:
-                    full_response += chunk['bytes'].decode('utf-8')
-        
-        return full_response
+        # Nothing here consumes the text before the stream ends, so join the
+        # raw chunks in one pass and decode once; a single decode can't split
+        # a multi-byte character across chunk boundaries. The final answer
+        # arrives as one chunk because streamFinalResponse is left off.
+        return b''.join(
+            event['chunk']['bytes']
+            for event in response['completion']
+            if 'bytes' in event.get('chunk', ())
+        ).decode('utf-8')
     except Exception as e:
         st.error(f"Error invoking agent: {str(e)}")
         return None
 
-def generate_recommendations_direct(session_id, profile_data=None):
-    """Generate recommendations using Lambda function directly with profile data"""
-    try:
-        # Use profile data if available, otherwise use default
-        if profile_data:
-            profile_value = profile_data
-        else:
-            # Default profile for testing
-            profile_value = {
-                "archetype": "Modern Professional",
-                "visual_style": ["Contemporary", "Refined"],
-                "energetic_essence": ["Confident", "Sophisticated"]
-            }
-        
-        # Call Lambda function directly for better control
-        recommendations_event = {
-            "messageVersion": "1.0",
-            "sessionId": session_id,
-            "actionGroup": "EssenceMirrorActions",
-            "httpMethod": "POST",
-            "apiPath": "/generateRecommendations",
-            "requestBody": {
-                "content": {
-                    "application/json": {
-                        "properties": [
-                            {
-                                "name": "profile",
-                                "value": profile_value
-                            }
-                        ]
-                    }
+def invoke_recommendations_lambda(session_id, profile_data=None):
+    """Call the recommendations Lambda and return its decoded payload"""
+    # Use profile data if available, otherwise use default
+    if profile_data:
+        profile_value = profile_data
+    else:
+        # Default profile for testing
+        profile_value = {
+            "archetype": "Modern Professional",
+            "visual_style": ["Contemporary", "Refined"],
+            "energetic_essence": ["Confident", "Sophisticated"]
+        }
+    
+    # Call Lambda function directly for better control
+    recommendations_event = {
+        "messageVersion": "1.0",
+        "sessionId": session_id,
+        "actionGroup": "EssenceMirrorActions",
+        "httpMethod": "POST",
+        "apiPath": "/generateRecommendations",
+        "requestBody": {
+            "content": {
+                "application/json": {
+                    "properties": [
+                        {
+                            "name": "profile",
+                            "value": profile_value
+                        }
+                    ]
                 }
             }
         }
-        
-        lambda_response = clients['lambda'].invoke(
-            FunctionName='essenceMirror',
-            Payload=json.dumps(recommendations_event)
-        )
-        
-        response_payload = json.loads(lambda_response['Payload'].read())
+    }
+    
+    return invoke_lambda_hedged(json_dumps(recommendations_event))
+
+def prefetch_recommendations(session_id, profile_data):
+    """Start generating recommendations in the background as soon as a profile exists"""
+    # At most one attempt per profile; a failed prefetch isn't retried on rerun
+    st.session_state.recommendations_prefetched = True
+    st.session_state.recommendations_future = get_executor().submit(
+        invoke_recommendations_lambda, session_id, profile_data
+    )
+
+def generate_recommendations_direct(session_id, profile_data=None, pending=None):
+    """Generate recommendations using Lambda function directly with profile data"""
+    try:
+        # Reuse a speculative request started after analysis when available
+        if pending is not None:
+            response_payload = pending.result(timeout=LAMBDA_RESULT_TIMEOUT)
+        else:
+            response_payload = invoke_recommendations_lambda(session_id, profile_data)
         
         if 'response' in response_payload and 'responseBody' in response_payload['response']:
             response_body = response_payload['response']['responseBody']
@@ -383,7 +423,7 @@ def generate_recommendations_direct(session_id, profile_data=None):
             
             # Handle JSON string in responseBody
             elif 'application/json' in response_body:
-                body_content = json.loads(response_body['application/json']['body'])
+                body_content = load_json_body(response_body['application/json'])
                 
                 if 'recommendations' in body_content:
                     return body_content['recommendations']
@@ -402,7 +442,28 @@ def generate_recommendations_direct(session_id, profile_data=None):
         st.error(f"Error generating recommendations: {str(e)}")
         return None
 
-def generate_style_collage(session_id, category="lifestyle", profile_data=None, recommendations_data=None):
+def generate_style_collage(session_id, category="lifestyle", profile_data=None, recommendations_data=None, force=False):
+    """Generate a category-specific style collage, reusing this session's earlier result"""
+    cache = st.session_state.collage_cache
+    # The collage is built from the profile and recommendations, so a new
+    # analysis or new recommendations must not get the old one back
+    inputs = json.dumps([profile_data, recommendations_data], sort_keys=True, default=str)
+    key = (session_id, category, hashlib.sha1(inputs.encode('utf-8')).hexdigest())
+    if force:
+        cache.pop(key, None)
+    elif key in cache:
+        return cache[key]
+    
+    # Ask for just the S3 URL so the image doesn't travel base64-encoded
+    # through the Lambda response; fall back to inline data without one
+    result = _generate_style_collage(session_id, category, profile_data, recommendations_data, "url")
+    if result and 'url' not in result and 'bytes' not in result:
+        result = _generate_style_collage(session_id, category, profile_data, recommendations_data, "base64")
+    if result:
+        cache[key] = result
+    return result
+
+def _generate_style_collage(session_id, category, profile_data, recommendations_data, return_format):
     """Generate a category-specific style collage using Nova Canvas with gender awareness"""
     try:
         # Extract gender information from profile
@@ -454,6 +515,10 @@ def generate_style_collage(session_id, category="lifestyle", profile_data=None,
                             {
                                 "name": "recommendations_data",
                                 "value": json.dumps(recommendations_data) if recommendations_data else "{}"
+                            },
+                            {
+                                "name": "return_format",
+                                "value": return_format
                             }
                         ]
                     }
@@ -461,12 +526,7 @@ def generate_style_collage(session_id, category="lifestyle", profile_data=None,
             }
         }
         
-        lambda_response = clients['lambda'].invoke(
-            FunctionName='essenceMirror',
-            Payload=json.dumps(test_event)
-        )
-        
-        response_payload = json.loads(lambda_response['Payload'].read())
+        response_payload = _invoke_lambda(json_dumps(test_event))
         
         if 'response' in response_payload and 'responseBody' in response_payload['response']:
             response_body = response_payload['response']['responseBody']
@@ -475,16 +535,17 @@ def generate_style_collage(session_id, category="lifestyle", profile_data=None,
             if isinstance(response_body, dict):
                 body_content = response_body
             elif 'application/json' in response_body:
-                body_content = json.loads(response_body['application/json']['body'])
+                body_content = load_json_body(response_body['application/json'])
             else:
                 body_content = response_body
                 
-            # Return both URL, base64, and prompt for better display options
+            # Return the URL, or the image bytes when there is no URL, plus
+            # the prompt; base64 is decoded once here rather than on every rerun
             result = {}
             if 'collage_url' in body_content:
                 result['url'] = body_content['collage_url']
-            if 'collage_base64' in body_content:
-                result['base64'] = body_content['collage_base64']
+            elif 'collage_base64' in body_content:
+                result['bytes'] = _b64().b64decode(body_content['collage_base64'])
             if 'prompt_used' in body_content:
                 result['prompt_used'] = body_content['prompt_used']
             
@@ -692,34 +753,157 @@ def display_recommendations(recommendations):
         cleaned_recommendations = clean_text(str(recommendations))
         st.write(cleaned_recommendations)
 
+# Collage styles offered in the UI, built once instead of on every rerun
+COLLAGE_OPTIONS = {
+    "fashion": "🎽 Fashion Lookbook - Showcase your recommended items and brands",
+    "lifestyle": "🌟 Lifestyle Vision - Your aspirational daily life aesthetic", 
+    "color_palette": "🎨 Color Palette - Perfect color coordination guide",
+    "interior": "🏠 Interior Aesthetic - Your ideal home environment",
+    "mood": "✨ Artistic Mood - Creative interpretation of your style essence"
+}
+COLLAGE_KEYS = tuple(COLLAGE_OPTIONS)
+_collage_label = COLLAGE_OPTIONS.__getitem__  # selectbox format_func
+
+@st.fragment
+def render_collage_panel():
+    """Render the collage column; its widgets rerun only this fragment"""
+    st.markdown("### 🎨 Visual Style Collage")
+    
+    if st.session_state.analysis_complete:
+        # Debug info and test functionality
+        debug_enabled = st.checkbox("🔍 Debug Info", key="debug_collage")
+        
+        if debug_enabled:
+            st.write("**Session State Keys:**", list(st.session_state.keys()))
+            collage_data = st.session_state.get('collage_data')
+            if collage_data is not None:
+                st.write("**Collage Data Keys:**", list(collage_data.keys()))
+                st.write("**Collage Data Preview:**", {k: str(v)[:100] + "..." if len(str(v)) > 100 else str(v) for k, v in collage_data.items()})
+            else:
+                st.write("**Collage Data:**", "None")
+            
+            recommendations_data = st.session_state.get('recommendations_data')
+            st.write("**Has Recommendations:**", recommendations_data is not None)
+            if recommendations_data:
+                st.write("**Recommendations Preview:**", str(recommendations_data)[:200] + "..." if len(str(recommendations_data)) > 200 else str(recommendations_data))
+        
+        # Category selection with enhanced descriptions
+        collage_category = st.selectbox(
+            "Choose collage style:",
+            COLLAGE_KEYS,
+            format_func=_collage_label,
+            index=0,
+            key="collage_category_select"
+        )
+        
+        # Generate collage button
+        if st.button("🎨 Generate Style Collage", use_container_width=True):
+            with st.spinner(f"Creating your {collage_category} style collage..."):
+                try:
+                    collage_result = generate_style_collage(
+                        st.session_state.session_id, 
+                        collage_category,
+                        st.session_state.profile_data,
+                        st.session_state.get('recommendations_data', None)
+                    )
+                    
+                    if collage_result:
+                        st.session_state.collage_data = collage_result
+                        st.success("🎨 Your style collage is ready!")
+                        
+                        # Display immediately
+                        if 'url' in collage_result:
+                            st.image(collage_result['url'], caption="Your Style Collage", use_column_width=True)
+                        elif 'bytes' in collage_result:
+                            st.image(collage_result['bytes'], caption="Your Style Collage", use_column_width=True)
+                        
+                        if 'prompt_used' in collage_result:
+                            with st.expander("🎯 Collage Inspiration"):
+                                st.write(collage_result['prompt_used'])
+                    else:
+                        st.error("Failed to generate collage. Please try again.")
+                except Exception as e:
+                    st.error(f"Error generating collage: {str(e)}")
+        
+        # Test button for debugging (only show if debug is enabled)
+        if debug_enabled:
+            if st.button("🧪 Test Collage Generation", use_container_width=True):
+                with st.spinner("Testing collage generation..."):
+                    try:
+                        test_result = generate_style_collage(
+                            "test-session-ui",
+                            "fashion",
+                            {"gender": "female", "age_group": "adult"},
+                            {"recommendations": [{"brand": "Test Brand", "product": "Test Product"}]},
+                            force=True
+                        )
+                        if test_result:
+                            st.success("✅ Test collage generated successfully!")
+                            if 'url' in test_result:
+                                st.image(test_result['url'], caption="Test Collage", use_column_width=True)
+                            elif 'bytes' in test_result:
+                                st.image(test_result['bytes'], caption="Test Collage", use_column_width=True)
+                        else:
+                            st.error("❌ Test collage generation failed")
+                    except Exception as e:
+                        st.error(f"❌ Test error: {str(e)}")
+        
+        # Display persistent collage
+        collage_data = st.session_state.get('collage_data')
+        if collage_data is not None:
+            st.write("**Stored Collage:**")
+            try:
+                # Prefer the URL so the browser fetches and caches the image itself
+                if 'url' in collage_data:
+                    st.image(collage_data['url'], caption="Your Stored Style Collage", use_column_width=True)
+                elif 'bytes' in collage_data:
+                    st.image(collage_data['bytes'], caption="Your Stored Style Collage", use_column_width=True)
+                
+                if st.button("🗑️ Clear Stored Collage", use_container_width=True):
+                    st.session_state.collage_data = None
+                    st.session_state.collage_cache.clear()
+                    st.rerun(scope="fragment")
+                    
+            except Exception as e:
+                st.error(f"Error displaying stored collage: {str(e)}")
+                st.session_state.collage_data = None
+    else:
+        st.info("👆 Complete your style analysis first to generate visual collages")
+
+# Per-session state and its initial values; callables are invoked per session
+SESSION_DEFAULTS = {
+    'session_id': lambda: str(uuid.uuid4()),
+    'analysis_complete': False,
+    'profile_data': None,
+    'recommendations_generated': False,
+    'recommendations_data': None,
+    'recommendations_future': None,
+    'recommendations_prefetched': False,
+    'collage_data': None,
+    'collage_cache': dict,
+    'collage_category': 'lifestyle',
+    'video_generated': False,
+    'video_url': None,
+    'current_image_hash': None,
+    's3_key': None,
+    'upload_digest': None,
+    'preview_thumb': None
+}
+
 def main():
     # Header
     st.title("✨ EssenceMirror")
     st.subheader("Discover Your Personal Style & Get Tailored Recommendations")
     
     # Initialize session state
-    if 'session_id' not in st.session_state:
-        st.session_state.session_id = str(uuid.uuid4())
-    if 'analysis_complete' not in st.session_state:
-        st.session_state.analysis_complete = False
-    if 'profile_data' not in st.session_state:
-        st.session_state.profile_data = None
-    if 'recommendations_generated' not in st.session_state:
-        st.session_state.recommendations_generated = False
-    if 'recommendations_data' not in st.session_state:
-        st.session_state.recommendations_data = None
-    if 'collage_data' not in st.session_state:
-        st.session_state.collage_data = None
-    if 'collage_category' not in st.session_state:
-        st.session_state.collage_category = 'lifestyle'
-    if 'video_generated' not in st.session_state:
-        st.session_state.video_generated = False
-    if 'video_url' not in st.session_state:
-        st.session_state.video_url = None
-    if 'current_image_hash' not in st.session_state:
-        st.session_state.current_image_hash = None
-    if 's3_key' not in st.session_state:
-        st.session_state.s3_key = None
+    for key, default in SESSION_DEFAULTS.items():
+        st.session_state.setdefault(key, default() if callable(default) else default)
+    st.session_state.setdefault('session_id_short', st.session_state.session_id[:8])
+    
+    # Warm the Lambda once per session while the user picks a photo
+    if 'lambda_warmed' not in st.session_state:
+        warm_lambda()
+        st.session_state.lambda_warmed = True
     
     # Sidebar
     with st.sidebar:
@@ -731,7 +915,7 @@ def main():
         if NOVA_REEL_AVAILABLE:
             st.markdown("5. 🎬 Create style video")
         st.markdown("---")
-        st.markdown(f"**Session ID:** `{st.session_state.session_id[:8]}...`")
+        st.markdown(f"**Session ID:** `{st.session_state.session_id_short}...`")
         
         # Features info
         st.markdown("---")
@@ -758,7 +942,6 @@ def main():
         
         if uploaded_file is not None:
             # Generate image hash immediately when file is uploaded
-            import hashlib
             file_bytes = uploaded_file.getvalue()
             image_hash = hashlib.md5(file_bytes).hexdigest()[:8]
             
@@ -770,17 +953,26 @@ def main():
                 st.session_state.profile_data = None
                 st.session_state.recommendations_generated = False
                 st.session_state.recommendations_data = None
+                st.session_state.recommendations_future = None
+                st.session_state.recommendations_prefetched = False
                 st.session_state.collage_data = None
+                st.session_state.collage_cache = {}
                 st.session_state.video_generated = False
                 st.session_state.video_url = None
+                st.session_state.preview_thumb = None
                 st.info("🔄 New image detected - ready for fresh analysis!")
             
-            # Display uploaded image
-            st.image(uploaded_file, caption="Your uploaded image", use_column_width=True)
+            # Display uploaded image from a thumbnail decoded once per image
+            if st.session_state.preview_thumb is None:
+                st.session_state.preview_thumb = make_preview_thumbnail(uploaded_file)
+            st.image(st.session_state.preview_thumb, caption="Your uploaded image", use_column_width=True)
             
             # Upload and analyze button
             if st.button("🔍 Analyze My Style", type="primary"):
                 with st.spinner("Uploading image and analyzing your style..."):
+                    # Re-warm the Lambda in the background while the upload is in flight
+                    warm_lambda()
+                    
                     # Upload to S3
                     s3_key = upload_image_to_s3(uploaded_file)
                     
@@ -815,10 +1007,10 @@ def main():
                         
                         lambda_response = clients['lambda'].invoke(
                             FunctionName='essenceMirror',
-                            Payload=json.dumps(analysis_event)
+                            Payload=json_dumps(analysis_event)
                         )
                         
-                        response_payload = json.loads(lambda_response['Payload'].read())
+                        response_payload = json_loads(lambda_response['Payload'].read())
                         
                         # Extract the actual analysis from Lambda response
                         analysis_response = None
@@ -859,6 +1051,9 @@ def main():
                             st.info("💡 Make sure the image shows a person clearly and try again.")
                         else:
                             st.session_state.profile_data = analysis_response
+                            # A new profile needs its own recommendations request
+                            st.session_state.recommendations_future = None
+                            st.session_state.recommendations_prefetched = False
                             st.session_state.analysis_complete = True
                             st.success("🎉 Style analysis complete!")
                             st.rerun()
@@ -896,10 +1091,10 @@ def main():
                         
                         lambda_response = clients['lambda'].invoke(
                             FunctionName='essenceMirror',
-                            Payload=json.dumps(analysis_event)
+                            Payload=json_dumps(analysis_event)
                         )
                         
-                        response_payload = json.loads(lambda_response['Payload'].read())
+                        response_payload = json_loads(lambda_response['Payload'].read())
                         
                         # Generate image-specific analysis using stored hash
                         if st.session_state.current_image_hash:
@@ -912,9 +1107,11 @@ def main():
                         
                         if analysis_response:
                             st.session_state.profile_data = analysis_response
+                            # A new profile needs its own recommendations request
+                            st.session_state.recommendations_future = None
+                            st.session_state.recommendations_prefetched = False
                             st.session_state.analysis_complete = True
                             st.success("✅ Analysis complete!")
-                            st.rerun()
     
     with col2:
         st.markdown("### 🎯 Your Style Profile & Recommendations")
@@ -922,34 +1119,26 @@ def main():
         if st.session_state.analysis_complete and st.session_state.profile_data:
             # Generate recommendations button (prominent at top)
             if not st.session_state.recommendations_generated:
+                # Start recommendations in the background once the final profile is known
+                if PREFETCH_RECOMMENDATIONS_ENABLED and not st.session_state.recommendations_prefetched:
+                    prefetch_recommendations(st.session_state.session_id, st.session_state.profile_data)
+                
                 if st.button("✨ Get My Recommendations", type="primary", use_container_width=True):
                     with st.spinner("Generating your personalized recommendations..."):
-                        # Debug: Show what profile we're sending
-                        st.write("🔍 **Debug - Profile being sent:**")
-                        st.json(st.session_state.profile_data)
-                        
                         # Pass the profile data to the recommendation function
                         recommendations = generate_recommendations_direct(
                             st.session_state.session_id, 
-                            st.session_state.profile_data
+                            st.session_state.profile_data,
+                            st.session_state.recommendations_future
                         )
-                        
-                        # Debug: Show what we got back
-                        st.write("🔍 **Debug - Recommendations received:**")
-                        st.write(f"Type: {type(recommendations)}")
-                        st.write(f"Length: {len(recommendations) if recommendations else 'None'}")
-                        if recommendations:
-                            st.write("First recommendation structure:")
-                            st.json(recommendations[0] if len(recommendations) > 0 else {})
+                        st.session_state.recommendations_future = None
                         
                         if recommendations:
                             st.session_state.recommendations_data = recommendations
                             st.session_state.recommendations_generated = True
                             st.success("🎉 Your personalized recommendations are ready!")
-                            st.rerun()
                         else:
                             st.error("❌ No recommendations were generated. Please try again.")
-                            st.write("This might be a Lambda function issue. Check the debug output above.")
             
             # Display recommendations if generated
             if st.session_state.recommendations_generated and st.session_state.recommendations_data:
@@ -1011,113 +1200,7 @@ def main():
             st.info("👆 Upload and analyze your photo first to get personalized recommendations")
     
     with col3:
-        st.markdown("### 🎨 Visual Style Collage")
-        
-        if st.session_state.analysis_complete:
-            # Debug info and test functionality
-            debug_enabled = st.checkbox("🔍 Debug Info", key="debug_collage")
-            
-            if debug_enabled:
-                st.write("**Session State Keys:**", list(st.session_state.keys()))
-                collage_data = st.session_state.get('collage_data')
-                if collage_data is not None:
-                    st.write("**Collage Data Keys:**", list(collage_data.keys()))
-                    st.write("**Collage Data Preview:**", {k: str(v)[:100] + "..." if len(str(v)) > 100 else str(v) for k, v in collage_data.items()})
-                else:
-                    st.write("**Collage Data:**", "None")
-                
-                recommendations_data = st.session_state.get('recommendations_data')
-                st.write("**Has Recommendations:**", recommendations_data is not None)
-                if recommendations_data:
-                    st.write("**Recommendations Preview:**", str(recommendations_data)[:200] + "..." if len(str(recommendations_data)) > 200 else str(recommendations_data))
-            
-            # Category selection with enhanced descriptions
-            collage_options = {
-                "fashion": "🎽 Fashion Lookbook - Showcase your recommended items and brands",
-                "lifestyle": "🌟 Lifestyle Vision - Your aspirational daily life aesthetic", 
-                "color_palette": "🎨 Color Palette - Perfect color coordination guide",
-                "interior": "🏠 Interior Aesthetic - Your ideal home environment",
-                "mood": "✨ Artistic Mood - Creative interpretation of your style essence"
-            }
-            
-            collage_category = st.selectbox(
-                "Choose collage style:",
-                list(collage_options.keys()),
-                format_func=lambda x: collage_options[x],
-                index=0,
-                key="collage_category_select"
-            )
-            
-            # Generate collage button
-            if st.button("🎨 Generate Style Collage", use_container_width=True):
-                with st.spinner(f"Creating your {collage_category} style collage..."):
-                    try:
-                        collage_result = generate_style_collage(
-                            st.session_state.session_id, 
-                            collage_category,
-                            st.session_state.profile_data,
-                            st.session_state.get('recommendations_data', None)
-                        )
-                        
-                        if collage_result:
-                            st.session_state.collage_data = collage_result
-                            st.success("🎨 Your style collage is ready!")
-                            
-                            # Display immediately
-                            if 'base64' in collage_result:
-                                import base64
-                                image_data = base64.b64decode(collage_result['base64'])
-                                st.image(image_data, caption="Your Style Collage", use_column_width=True)
-                            
-                            if 'prompt_used' in collage_result:
-                                with st.expander("🎯 Collage Inspiration"):
-                                    st.write(collage_result['prompt_used'])
-                        else:
-                            st.error("Failed to generate collage. Please try again.")
-                    except Exception as e:
-                        st.error(f"Error generating collage: {str(e)}")
-            
-            # Test button for debugging (only show if debug is enabled)
-            if debug_enabled:
-                if st.button("🧪 Test Collage Generation", use_container_width=True):
-                    with st.spinner("Testing collage generation..."):
-                        try:
-                            test_result = generate_style_collage(
-                                "test-session-ui",
-                                "fashion",
-                                {"gender": "female", "age_group": "adult"},
-                                {"recommendations": [{"brand": "Test Brand", "product": "Test Product"}]}
-                            )
-                            if test_result:
-                                st.success("✅ Test collage generated successfully!")
-                                if 'base64' in test_result:
-                                    import base64
-                                    image_data = base64.b64decode(test_result['base64'])
-                                    st.image(image_data, caption="Test Collage", use_column_width=True)
-                            else:
-                                st.error("❌ Test collage generation failed")
-                        except Exception as e:
-                            st.error(f"❌ Test error: {str(e)}")
-            
-            # Display persistent collage
-            collage_data = st.session_state.get('collage_data')
-            if collage_data is not None:
-                st.write("**Stored Collage:**")
-                try:
-                    if 'base64' in collage_data:
-                        import base64
-                        image_data = base64.b64decode(collage_data['base64'])
-                        st.image(image_data, caption="Your Stored Style Collage", use_column_width=True)
-                    
-                    if st.button("🗑️ Clear Stored Collage", use_container_width=True):
-                        st.session_state.collage_data = None
-                        st.rerun()
-                        
-                except Exception as e:
-                    st.error(f"Error displaying stored collage: {str(e)}")
-                    st.session_state.collage_data = None
-        else:
-            st.info("👆 Complete your style analysis first to generate visual collages")
+        render_collage_panel()
     
     # Nova Reel column (if available)
     if NOVA_REEL_AVAILABLE:
@@ -1153,7 +1236,6 @@ def main():
                                     st.session_state.video_url = video_url
                                     st.session_state.video_generated = True
                                     st.success("🎬 Your style video is ready!")
-                                    st.rerun()
                             finally:
                                 # Clean up temporary file
                                 if os.path.exists(temp_path):
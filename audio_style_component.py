@@ -7,6 +7,7 @@ import streamlit as st
 import os
 import sys
 import json
+import hashlib
 import time
 import uuid
 import tempfile
@@ -17,13 +18,19 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Add the current directory to the path for imports
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# Add the current directory to the path for imports (guarded, since
+# Streamlit re-executes this module and would otherwise grow sys.path)
+_HERE = os.path.dirname(__file__)
+if _HERE not in sys.path:
+    sys.path.insert(0, _HERE)
+
+# Infrastructure checkout for local development, opt-in via environment
+_INFRA_PATH = os.environ.get('ESSENCE_INFRA_PATH')
+if _INFRA_PATH and _INFRA_PATH not in sys.path:
+    sys.path.append(_INFRA_PATH)
 
 # Try to import the audio generator
 try:
-    # Add infrastructure path for local development
-    sys.path.append('/Users/kirubelaklilu/Documents/EssenceMirror/essence-mirror-infrastructure')
     from polly_audio_generator import EssenceMirrorAudioGenerator
     AUDIO_GENERATOR_AVAILABLE = True
 except ImportError as e:
@@ -33,6 +40,8 @@ except ImportError as e:
     EssenceMirrorAudioGenerator = None
 
 # Configuration
+AUDIO_CACHE_MAX_ENTRIES = 20
+
 SUPPORTED_VOICES = {
     "joanna": "Joanna - Professional Female (US)",
     "matthew": "Matthew - Warm Male (US)", 
@@ -45,6 +54,9 @@ SUPPORTED_VOICES = {
 def render_audio_style_tab(session_id, analysis_complete, style_analysis_data=None):
     """Render the Audio Style tab content"""
     
+    # Set by the host app at startup; standalone runs set it here
+    st.session_state.setdefault('session_id_short', session_id[:8])
+    
     st.markdown("### 🎵 Listen to Your Style")
     st.markdown("**NEW**: Hear your personalized style analysis with professional AI narration!")
     
@@ -119,27 +131,44 @@ def generate_audio_content(style_analysis_data, voice_preference, session_id):
         st.error("Audio generator not available")
         return
     
+    # Reuse narration already generated this session for the same voice and analysis
+    if 'audio_cache' not in st.session_state:
+        st.session_state.audio_cache = {}
+    audio_cache = st.session_state.audio_cache
+    analysis_digest = hashlib.blake2b(
+        json.dumps(style_analysis_data, sort_keys=True, default=str).encode('utf-8'),
+        digest_size=16
+    ).hexdigest()
+    cache_key = (voice_preference, analysis_digest)
+    
     try:
-        with st.spinner("🎵 Generating your personalized audio content..."):
-            # Initialize the audio generator
-            generator = EssenceMirrorAudioGenerator(profile_name=None)  # Use environment credentials
-            
-            # Generate audio for all sections
-            audio_results = generator.generate_style_analysis_audio(
-                style_analysis=style_analysis_data,
-                voice_preference=voice_preference
-            )
-            
-            st.success(f"✅ Generated audio for {len(audio_results)} sections!")
-            
-            # Display audio players for each section
-            display_audio_players(audio_results, session_id)
+        audio_results = audio_cache.get(cache_key)
+        if audio_results is None:
+            with st.spinner("🎵 Generating your personalized audio content..."):
+                # Initialize the audio generator
+                generator = EssenceMirrorAudioGenerator(profile_name=None)  # Use environment credentials
+                
+                # Generate audio for all sections
+                audio_results = generator.generate_style_analysis_audio(
+                    style_analysis=style_analysis_data,
+                    voice_preference=voice_preference
+                )
             
+            # Evict the oldest entry once the cache is full
+            if len(audio_cache) >= AUDIO_CACHE_MAX_ENTRIES:
+                audio_cache.pop(next(iter(audio_cache)))
+            audio_cache[cache_key] = audio_results
+        
+        st.success(f"✅ Generated audio for {len(audio_results)} sections!")
+        
+        # Display audio players for each section
+        display_audio_players(audio_results, st.session_state.session_id_short)
+        
     except Exception as e:
         st.error(f"❌ Error generating audio: {str(e)}")
         logger.error(f"Audio generation error: {str(e)}")
 
-def display_audio_players(audio_results, session_id):
+def display_audio_players(audio_results, session_id_short):
     """Display audio players for generated content"""
     
     st.markdown("#### 🎧 Your Personalized Audio Content")
@@ -162,13 +191,7 @@ def display_audio_players(audio_results, session_id):
         duration = audio_result.get('estimated_duration', 0)
         size_kb = audio_result.get('size_bytes', 0) // 1024
         
-        col1, col2, col3 = st.columns([2, 1, 1])
-        with col1:
-            st.info(f"Duration: ~{duration} seconds")
-        with col2:
-            st.info(f"Size: {size_kb} KB")
-        with col3:
-            st.info(f"Voice: {audio_result.get('voice_id', 'Joanna')}")
+        st.caption(f"🕐 ~{duration}s · 💾 {size_kb} KB · 🎙️ {audio_result.get('voice_id', 'Joanna')}")
         
         # Create temporary file for audio playback
         try:
@@ -186,7 +209,7 @@ def display_audio_players(audio_results, session_id):
             st.download_button(
                 label=f"📥 Download {section_name.replace('_', ' ').title()}",
                 data=audio_result['audio_data'],
-                file_name=f"essencemirror_{section_name}_{session_id[:8]}.mp3",
+                file_name=f"essencemirror_{section_name}_{session_id_short}.mp3",
                 mime="audio/mpeg"
             )
             
@@ -1,17 +1,16 @@
 import streamlit as st
-import boto3
 import uuid
-from datetime import datetime
 import json
+import codecs
 import time
 import base64
 import os
-from io import BytesIO
-from PIL import Image
 import logging
 
-# Import the Style Reel component
-from style_reel_component import render_style_reel_tab
+from essence_mirror_core import (
+    S3_BUCKET, AGENT_ID, AGENT_ALIAS_ID, clients, get_executor, warm_lambda,
+    json_loads, load_json_body, make_preview_thumbnail, upload_image_to_s3
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -20,6 +19,15 @@ logger = logging.getLogger(__name__)
 # Feature flag for Style Reel functionality
 STYLE_REEL_ENABLED = True
 
+# Invoke collage generation asynchronously and poll S3 for the result.
+# Requires the essenceMirror Lambda to honour the "resultKey" event field.
+ASYNC_COLLAGE_ENABLED = False
+
+# Prefetch recommendations and the default collage with a single /generateAll
+# call once analysis completes. Requires the essenceMirror Lambda to serve it.
+GENERATE_ALL_ENABLED = False
+PREFETCH_COLLAGE_CATEGORY = "lifestyle"
+
 # Configure Streamlit page
 st.set_page_config(
     page_title="EssenceMirror - Personal Style Analysis & Video Generation",
@@ -27,173 +35,340 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize AWS clients
-@st.cache_resource
-def init_aws_clients():
-    # Use explicit session with default profile
-    session = boto3.Session(profile_name='default')
-    return {
-        's3': session.client('s3', region_name='us-east-1'),
-        'bedrock_agent': session.client('bedrock-agent-runtime', region_name='us-east-1'),
-        'lambda': session.client('lambda', region_name='us-east-1')
-    }
-
-clients = init_aws_clients()
-
 # Configuration
-S3_BUCKET = "essencemirror-user-uploads"
-AGENT_ID = "WWIUY28GRY"
-AGENT_ALIAS_ID = "TSTALIASID"
-
-def upload_image_to_s3(uploaded_file):
-    """Upload image to S3 and return the key"""
-    try:
-        # Generate unique filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        file_extension = uploaded_file.name.split('.')[-1]
-        s3_key = f"uploads/streamlit_{timestamp}_{uuid.uuid4().hex[:8]}.{file_extension}"
-        
-        # Upload to S3
-        clients['s3'].upload_fileobj(
-            uploaded_file,
-            S3_BUCKET,
-            s3_key,
-            ExtraArgs={'ContentType': uploaded_file.type}
-        )
-        
-        return s3_key
-    except Exception as e:
-        st.error(f"Error uploading image: {str(e)}")
-        return None
+COLLAGE_RESULT_PREFIX = "results/"
+COLLAGE_RESULT_TIMEOUT = 120  # seconds to wait for an async collage result
+LAMBDA_RESULT_TIMEOUT = 90  # seconds to wait for a background Lambda response
 
 def invoke_bedrock_agent(message, session_id):
-    """Invoke the Bedrock agent with a message"""
+    """Invoke the Bedrock agent with a message, yielding text as it streams in
+    
+    Errors are shown and re-raised, so a caller never mistakes the text
+    streamed so far for a complete answer.
+    """
     try:
         response = clients['bedrock_agent'].invoke_agent(
             agentId=AGENT_ID,
             agentAliasId=AGENT_ALIAS_ID,
             sessionId=session_id,
-            inputText=message
+            inputText=message,
+            # Without this the final answer arrives as a single chunk
+            streamingConfigurations={'streamFinalResponse': True}
         )
         
-        # Process the streaming response
-        full_response = ""
+        # Process the streaming response; the incremental decoder keeps
+        # multi-byte characters intact when they straddle chunk boundaries
+        decoder = codecs.getincrementaldecoder('utf-8')()
         for event in response['completion']:
             if 'chunk' in event:
                 chunk = event['chunk']
                 if 'bytes' in chunk:
-                    full_response += chunk['bytes'].decode('utf-8')
-        
-        return full_response
+                    text = decoder.decode(chunk['bytes'])
+                    if text:
+                        yield text
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            yield tail
     except Exception as e:
         st.error(f"Error invoking agent: {str(e)}")
-        return None
+        raise
 
-def generate_recommendations_direct(session_id):
-    """Generate recommendations using Lambda function directly"""
-    try:
-        # Call Lambda function directly for better control
-        recommendations_event = {
-            "messageVersion": "1.0",
-            "sessionId": session_id,
-            "actionGroup": "EssenceMirrorActions",
-            "httpMethod": "POST",
-            "apiPath": "/generateRecommendations",
-            "requestBody": {
-                "content": {
-                    "application/json": {
-                        "properties": [
-                            {
-                                "name": "lifestyle_focus",
-                                "value": "general"
-                            }
-                        ]
+# Lambda request bodies, serialized once. Only the %s fields vary per call;
+# fill them with _json_escape() so the result stays valid JSON.
+RECOMMENDATIONS_PAYLOAD_TEMPLATE = json.dumps({
+    "messageVersion": "1.0",
+    "sessionId": "%s",
+    "actionGroup": "EssenceMirrorActions",
+    "httpMethod": "POST",
+    "apiPath": "/generateRecommendations",
+    "requestBody": {
+        "content": {
+            "application/json": {
+                "properties": [
+                    {
+                        "name": "lifestyle_focus",
+                        "value": "general"
                     }
-                }
+                ]
             }
         }
-        
-        lambda_response = clients['lambda'].invoke(
-            FunctionName='essenceMirror',
-            Payload=json.dumps(recommendations_event)
+    }
+}).encode('utf-8')
+
+COLLAGE_EVENT_TEMPLATE = {
+    "messageVersion": "1.0",
+    "sessionId": "%s",
+    "actionGroup": "EssenceMirrorActions",
+    "httpMethod": "POST",
+    "apiPath": "/generateStyleCollage",
+    "requestBody": {
+        "content": {
+            "application/json": {
+                "properties": [
+                    {
+                        "name": "style_focus",
+                        "value": "%s"
+                    },
+                    {
+                        "name": "color_preference",
+                        "value": "personalized"
+                    },
+                    {
+                        "name": "return_format",
+                        "value": "%s"
+                    }
+                ]
+            }
+        }
+    }
+}
+COLLAGE_PAYLOAD_TEMPLATE = json.dumps(COLLAGE_EVENT_TEMPLATE).encode('utf-8')
+# Async variant: the Lambda writes its response JSON to S3 under resultKey
+COLLAGE_ASYNC_PAYLOAD_TEMPLATE = json.dumps(
+    dict(COLLAGE_EVENT_TEMPLATE, resultKey="%s")
+).encode('utf-8')
+
+# Same properties as the collage request; the Lambda runs both actions
+GENERATE_ALL_PAYLOAD_TEMPLATE = json.dumps(
+    dict(COLLAGE_EVENT_TEMPLATE, apiPath="/generateAll")
+).encode('utf-8')
+
+def _json_escape(value):
+    """Encode a string as the inside of a JSON string literal"""
+    return json.dumps(value)[1:-1].encode('utf-8')
+
+# Lambda results are cached per (session_id, category) so reruns don't repeat
+# the round-trip. Failures raise instead of returning, so they are never cached.
+@st.cache_data(ttl=3600, max_entries=128, show_spinner=False)
+def _fetch_recommendations(session_id):
+    """Cached wrapper around _invoke_recommendations"""
+    return _invoke_recommendations(session_id)
+
+def _invoke_recommendations(session_id):
+    """Call the recommendations Lambda and return the recommendations list"""
+    # Call Lambda function directly for better control
+    lambda_response = clients['lambda'].invoke(
+        FunctionName='essenceMirror',
+        Payload=RECOMMENDATIONS_PAYLOAD_TEMPLATE % _json_escape(session_id)
+    )
+    
+    response_payload = json_loads(lambda_response['Payload'].read())
+    
+    if 'response' in response_payload and 'responseBody' in response_payload['response']:
+        response_body = response_payload['response']['responseBody']
+        if 'application/json' in response_body:
+            body_content = load_json_body(response_body['application/json'])
+            
+            if 'recommendations' in body_content:
+                return body_content['recommendations']
+            elif 'error' in body_content:
+                raise RuntimeError(body_content['error'])
+    
+    raise RuntimeError("no recommendations in Lambda response")
+
+def prefetch_results(session_id):
+    """Start fetching results on the shared executor as soon as analysis completes"""
+    if GENERATE_ALL_ENABLED:
+        # Kept with its category so collage requests for another one never wait on it
+        st.session_state.prefetched = {
+            'category': PREFETCH_COLLAGE_CATEGORY,
+            'future': get_executor().submit(
+                _invoke_generate_all, session_id, PREFETCH_COLLAGE_CATEGORY
+            )
+        }
+    else:
+        st.session_state.recommendations_future = get_executor().submit(
+            _invoke_recommendations, session_id
         )
-        
-        response_payload = json.loads(lambda_response['Payload'].read())
-        
-        if 'response' in response_payload and 'responseBody' in response_payload['response']:
-            response_body = response_payload['response']['responseBody']
-            if 'application/json' in response_body:
-                body_content = json.loads(response_body['application/json']['body'])
-                
-                if 'recommendations' in body_content:
-                    return body_content['recommendations']
-                elif 'error' in body_content:
-                    st.error(f"Error generating recommendations: {body_content['error']}")
-                    return None
-        
+
+def _invoke_generate_all(session_id, category):
+    """Fetch recommendations and a collage for category with one Lambda call"""
+    lambda_response = clients['lambda'].invoke(
+        FunctionName='essenceMirror',
+        Payload=GENERATE_ALL_PAYLOAD_TEMPLATE % (
+            _json_escape(session_id), _json_escape(category), b'url'
+        )
+    )
+    response_payload = json_loads(lambda_response['Payload'].read())
+    body_content = load_json_body(response_payload['response']['responseBody']['application/json'])
+    if 'error' in body_content:
+        raise RuntimeError(body_content['error'])
+    
+    return {
+        'category': category,
+        'recommendations': body_content.get('recommendations'),
+        'collage': _collage_from_body(body_content)
+    }
+
+def _prefetched_result(category=None):
+    """Return the /generateAll prefetch result, or None if there is none or it failed
+    
+    With a category, a prefetch made for a different one is skipped without waiting.
+    """
+    prefetched = st.session_state.get('prefetched')
+    if prefetched is None or category not in (None, prefetched['category']):
         return None
-        
+    try:
+        return prefetched['future'].result(timeout=LAMBDA_RESULT_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"generateAll prefetch failed: {str(e)}")
+        st.session_state.prefetched = None
+        return None
+
+def generate_recommendations_direct(session_id, pending=None):
+    """Generate recommendations using Lambda function directly"""
+    try:
+        # Reuse a request started after analysis when there is one
+        prefetched = _prefetched_result()
+        if prefetched and prefetched['recommendations']:
+            return prefetched['recommendations']
+        if pending is not None:
+            return pending.result(timeout=LAMBDA_RESULT_TIMEOUT)
+        return _fetch_recommendations(session_id)
     except Exception as e:
         st.error(f"Error generating recommendations: {str(e)}")
         return None
 
-def generate_style_collage(session_id, category="lifestyle"):
+@st.cache_data(ttl=3600, max_entries=128, show_spinner=False)
+def _fetch_style_collage(session_id, category, regen=0):
+    """Call the collage Lambda and return the collage URL/bytes/prompt
+    
+    regen only varies the cache key, so "Generate New" gets a fresh entry.
+    """
+    # Ask for just the S3 URL so the image doesn't travel base64-encoded
+    # through the Lambda response; fall back to inline data without one
+    result = _request_style_collage(session_id, category, "url")
+    if 'url' not in result and 'bytes' not in result:
+        result = _request_style_collage(session_id, category, "base64")
+    return result
+
+def _request_style_collage(session_id, category, return_format):
+    """Invoke the collage Lambda once and parse its response"""
+    # Call the Lambda function directly for Nova Canvas
+    lambda_response = clients['lambda'].invoke(
+        FunctionName='essenceMirror',
+        Payload=COLLAGE_PAYLOAD_TEMPLATE % (
+            _json_escape(session_id), _json_escape(category), _json_escape(return_format)
+        )
+    )
+    return _collage_from_payload(json_loads(lambda_response['Payload'].read()))
+
+def _collage_from_payload(response_payload):
+    """Parse a collage Lambda response payload, raising if it holds no collage"""
+    if 'response' in response_payload and 'responseBody' in response_payload['response']:
+        response_body = response_payload['response']['responseBody']
+        if 'application/json' in response_body:
+            body_content = load_json_body(response_body['application/json'])
+            
+            result = _collage_from_body(body_content)
+            if result:
+                return result
+            elif 'error' in body_content:
+                raise RuntimeError(body_content['error'])
+    
+    raise RuntimeError("no collage in Lambda response")
+
+def _collage_from_body(body_content):
+    """Pick the collage URL, image bytes and prompt out of a Lambda response body"""
+    # Keep only what the panel displays: the URL, or the decoded image when
+    # there is no URL. st.cache_data copies its result on every hit, so the
+    # 1.33x-larger base64 string is never stored.
+    result = {}
+    if 'collage_url' in body_content:
+        result['url'] = body_content['collage_url']
+    elif 'collage_base64' in body_content:
+        result['bytes'] = base64.b64decode(body_content['collage_base64'])
+    if 'prompt_used' in body_content:
+        result['prompt_used'] = body_content['prompt_used']
+    return result
+
+def _start_collage_job(session_id, category):
+    """Start collage generation without holding a connection open
+    
+    The Lambda writes its response JSON to S3; _poll_collage_result picks it up.
+    """
+    result_key = f"{COLLAGE_RESULT_PREFIX}{uuid.uuid4()}.json"
+    clients['lambda'].invoke(
+        FunctionName='essenceMirror',
+        InvocationType='Event',
+        Payload=COLLAGE_ASYNC_PAYLOAD_TEMPLATE % (
+            _json_escape(session_id), _json_escape(category),
+            _json_escape("url"), _json_escape(result_key)
+        )
+    )
+    st.session_state.collage_job = {
+        'key': result_key,
+        'category': category,
+        'started_at': time.time()
+    }
+
+def _take_s3_json(key):
+    """Read and delete a JSON result object, or return None if it isn't there yet"""
+    s3 = clients['s3']
+    try:
+        obj = s3.get_object(Bucket=S3_BUCKET, Key=key)
+    except s3.exceptions.ClientError as e:
+        # Without s3:ListBucket a missing key is reported as AccessDenied
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404', 'AccessDenied', '403'):
+            return None
+        raise
+    body = json_loads(obj['Body'].read())
+    try:
+        s3.delete_object(Bucket=S3_BUCKET, Key=key)
+    except Exception as e:
+        logger.warning(f"Could not delete collage result {key}: {str(e)}")
+    return body
+
+@st.fragment(run_every=2)
+def _poll_collage_result():
+    """Check S3 for the running collage job; rerun the app once it ends"""
+    job = st.session_state.collage_job
+    try:
+        response_payload = _take_s3_json(job['key'])
+    except Exception as e:
+        logger.warning(f"Collage result check failed: {str(e)}")
+        response_payload = None
+    
+    elapsed = time.time() - job['started_at']
+    if response_payload is None:
+        if elapsed < COLLAGE_RESULT_TIMEOUT:
+            st.caption(f"🎨 Creating your collage... {int(elapsed)}s")
+            return
+        st.session_state.collage_notice = f"No collage after {COLLAGE_RESULT_TIMEOUT}s. Please try again."
+    else:
+        try:
+            st.session_state.collage_data = _collage_from_payload(response_payload)
+            st.session_state.collage_category = job['category']
+        except Exception as e:
+            st.session_state.collage_notice = f"Error generating style collage: {str(e)}"
+    st.session_state.collage_job = None
+    # Rerun the whole app so the collage panel shows the result
+    st.rerun()
+
+def generate_style_collage(session_id, category="lifestyle", force=False):
     """Generate a category-specific style collage using Nova Canvas"""
+    regens = st.session_state.collage_regen
+    if force:
+        # A new cache key for this session and category only; other
+        # sessions' cached collages are left alone
+        regens[category] = regens.get(category, 0) + 1
+    else:
+        prefetched = _prefetched_result(category)
+        if prefetched and prefetched['collage']:
+            return prefetched['collage']
+    if ASYNC_COLLAGE_ENABLED:
+        if st.session_state.collage_job is not None:
+            st.info("A collage is already being generated.")
+            return None
+        try:
+            _start_collage_job(session_id, category)
+        except Exception as e:
+            st.error(f"Error generating style collage: {str(e)}")
+            return None
+        # Full rerun so the tab-level poller, outside this fragment, starts
+        st.rerun()
     try:
-        # Call the Lambda function directly for Nova Canvas
-        test_event = {
-            "messageVersion": "1.0",
-            "sessionId": session_id,
-            "actionGroup": "EssenceMirrorActions",
-            "httpMethod": "POST",
-            "apiPath": "/generateStyleCollage",
-            "requestBody": {
-                "content": {
-                    "application/json": {
-                        "properties": [
-                            {
-                                "name": "style_focus",
-                                "value": category
-                            },
-                            {
-                                "name": "color_preference",
-                                "value": "personalized"
-                            }
-                        ]
-                    }
-                }
-            }
-        }
-        
-        lambda_response = clients['lambda'].invoke(
-            FunctionName='essenceMirror',
-            Payload=json.dumps(test_event)
-        )
-        
-        response_payload = json.loads(lambda_response['Payload'].read())
-        
-        if 'response' in response_payload and 'responseBody' in response_payload['response']:
-            response_body = response_payload['response']['responseBody']
-            if 'application/json' in response_body:
-                body_content = json.loads(response_body['application/json']['body'])
-                
-                # Return both URL, base64, and prompt for better display options
-                result = {}
-                if 'collage_url' in body_content:
-                    result['url'] = body_content['collage_url']
-                if 'collage_base64' in body_content:
-                    result['base64'] = body_content['collage_base64']
-                if 'prompt_used' in body_content:
-                    result['prompt_used'] = body_content['prompt_used']
-                
-                if result:
-                    return result
-                elif 'error' in body_content:
-                    st.error(f"Error generating collage: {body_content['error']}")
-                    return None
-        
-        return None
-        
+        return _fetch_style_collage(session_id, category, regens.get(category, 0))
     except Exception as e:
         st.error(f"Error generating style collage: {str(e)}")
         return None
@@ -253,52 +428,198 @@ def display_recommendations(recommendations):
         # Text format
         st.write(recommendations)
 
+# Static UI content, built once instead of on every rerun
+COLLAGE_CATEGORIES = {
+    "wardrobe": "👗 Wardrobe & Fashion",
+    "interior": "🏠 Home & Interior Design", 
+    "travel": "✈️ Travel & Experiences",
+    "lifestyle": "🌟 Complete Lifestyle"
+}
+COLLAGE_KEYS = tuple(COLLAGE_CATEGORIES)
+_collage_label = COLLAGE_CATEGORIES.__getitem__  # selectbox format_func
+
+SIDEBAR_FEATURES_MD = """### ✨ EssenceMirror Features:
+1. 📸 **Style Analysis** - Upload & analyze your style
+2. 🎨 **Visual Collages** - AI-generated mood boards
+3. 🎬 **Style Videos** - Dynamic style content
+
+---
+"""
+
+_VIDEO_STATUS_MD = "✅ Style Videos (Nova Reel)" if STYLE_REEL_ENABLED else "🚧 Style Videos (Coming Soon)"
+SIDEBAR_STATUS_MD = f"""---
+
+### 🚀 Available Features:
+
+✅ Style Analysis
+
+✅ Visual Collages (Nova Canvas)
+
+{_VIDEO_STATUS_MD}
+
+---
+
+### 💡 Tips:
+
+• Use clear, well-lit photos
+
+• Try different style focuses
+
+• Experiment with video prompts
+"""
+
+@st.fragment
+def render_collage_panel():
+    """Render the Visual Collages tab; its widgets rerun only this fragment"""
+    if st.session_state.analysis_complete:
+        st.markdown("### 🎨 Visual Style Collages")
+        
+        # Outcome of an async collage job that failed, shown once
+        notice = st.session_state.pop('collage_notice', None)
+        if notice:
+            st.error(notice)
+        st.markdown("Generate beautiful mood boards focused on specific areas of your lifestyle!")
+        
+        # Category selection
+        selected_category = st.selectbox(
+            "Select collage focus:",
+            options=COLLAGE_KEYS,
+            format_func=_collage_label,
+            index=0,
+            key="collage_selector"
+        )
+        
+        # Style collage generation button
+        if st.button(f"🎨 Generate {COLLAGE_CATEGORIES[selected_category]} Collage", type="primary", key="collage_btn"):
+            with st.spinner(f"Creating your personalized {COLLAGE_CATEGORIES[selected_category].lower()} collage... This may take a few seconds."):
+                collage_result = generate_style_collage(st.session_state.session_id, selected_category)
+                
+                if collage_result:
+                    st.session_state.collage_data = collage_result
+                    st.session_state.collage_category = selected_category
+                    st.success(f"🎉 Your {COLLAGE_CATEGORIES[selected_category].lower()} collage is ready!")
+                    st.rerun(scope="fragment")
+        
+        # Display generated collage; read session state once into locals
+        coll = st.session_state.get('collage_data')
+        if coll:
+            cat = st.session_state.get('collage_category', 'lifestyle')
+            category_name = COLLAGE_CATEGORIES.get(cat, 'Style')
+            st.markdown(f"#### 🖼️ Your {category_name} Collage:")
+            
+            # Try to display the image using different methods
+            collage_displayed = False
+            
+            # Method 1: Try URL first; the browser fetches and caches it,
+            # so no image bytes are decoded or sent over the websocket
+            if 'url' in coll:
+                try:
+                    st.image(
+                        coll['url'], 
+                        caption=f"Your AI-Generated {category_name} Mood Board", 
+                        use_column_width=True
+                    )
+                    collage_displayed = True
+                    
+                except Exception as e:
+                    st.warning(f"Could not display image from URL: {str(e)}")
+            
+            # Method 2: Fall back to the inline image
+            if not collage_displayed and 'bytes' in coll:
+                try:
+                    # st.image takes the raw bytes directly
+                    st.image(
+                        coll['bytes'],
+                        caption=f"Your AI-Generated {category_name} Mood Board", 
+                        use_column_width=True
+                    )
+                    collage_displayed = True
+                    
+                except Exception as e:
+                    st.warning(f"Could not display inline image: {str(e)}")
+            
+            # Display the prompt used (for troubleshooting)
+            if collage_displayed and 'prompt_used' in coll:
+                with st.expander("🔍 View Prompt Used"):
+                    st.text_area("Prompt for Nova Canvas", 
+                                coll['prompt_used'], 
+                                height=200)
+            
+            # Method 3: Fallback to link
+            if not collage_displayed:
+                st.error("Could not display image directly. Here's the link:")
+                if 'url' in coll:
+                    st.markdown(f"[🔗 View Your {category_name} Collage]({coll['url']})")
+            
+            # Additional options
+            if collage_displayed:
+                col_a, col_b, col_c = st.columns(3)
+                
+                with col_a:
+                    if st.button("🔄 Generate New", key="new_collage_btn"):
+                        with st.spinner(f"Creating a new {category_name.lower()} collage..."):
+                            new_collage = generate_style_collage(st.session_state.session_id, cat, force=True)
+                            if new_collage:
+                                st.session_state.collage_data = new_collage
+                                st.success("🎉 New collage generated!")
+                                st.rerun(scope="fragment")
+                
+                with col_b:
+                    if 'url' in coll:
+                        st.markdown(f"[🔗 Full Size]({coll['url']})")
+                
+                with col_c:
+                    # Category switch button
+                    if st.button("🎯 Change Focus", key="change_focus_btn"):
+                        # Clear current collage to show category selector
+                        if 'collage_data' in st.session_state:
+                            del st.session_state.collage_data
+                        st.rerun(scope="fragment")
+            
+    else:
+        st.info("Complete your style analysis first to generate visual collages!")
+
+# Per-session state and its initial values; callables are invoked per session
+SESSION_DEFAULTS = {
+    'session_id': lambda: str(uuid.uuid4()),
+    'analysis_complete': False,
+    'profile_data': None,
+    'recommendations_generated': False,
+    'recommendations_data': None,
+    'recommendations_future': None,
+    'prefetched': None,
+    'collage_data': None,
+    'collage_category': 'lifestyle',
+    'collage_regen': lambda: {},
+    'collage_job': None,
+    'upload_digest': None,
+    's3_key': None,
+    'preview_thumb': None,
+    'preview_file_id': None
+}
+
 def main():
     # Header
     st.title("✨ EssenceMirror")
     st.subheader("Discover Your Personal Style & Create Dynamic Content")
     
     # Initialize session state
-    if 'session_id' not in st.session_state:
-        st.session_state.session_id = str(uuid.uuid4())
-    if 'analysis_complete' not in st.session_state:
-        st.session_state.analysis_complete = False
-    if 'profile_data' not in st.session_state:
-        st.session_state.profile_data = None
-    if 'recommendations_generated' not in st.session_state:
-        st.session_state.recommendations_generated = False
-    if 'recommendations_data' not in st.session_state:
-        st.session_state.recommendations_data = None
-    if 'collage_data' not in st.session_state:
-        st.session_state.collage_data = None
-    if 'collage_category' not in st.session_state:
-        st.session_state.collage_category = 'lifestyle'
+    for key, default in SESSION_DEFAULTS.items():
+        st.session_state.setdefault(key, default() if callable(default) else default)
+    st.session_state.setdefault('session_id_short', st.session_state.session_id[:8])
+    
+    # Warm the Lambda once per session while the user picks a photo
+    if 'lambda_warmed' not in st.session_state:
+        warm_lambda()
+        st.session_state.lambda_warmed = True
     
     # Sidebar
     with st.sidebar:
-        st.markdown("### ✨ EssenceMirror Features:")
-        st.markdown("1. 📸 **Style Analysis** - Upload & analyze your style")
-        st.markdown("2. 🎨 **Visual Collages** - AI-generated mood boards")
-        st.markdown("3. 🎬 **Style Videos** - Dynamic style content")
-        st.markdown("---")
-        st.markdown(f"**Session ID:** `{st.session_state.session_id[:8]}...`")
-        
-        # Feature status
-        st.markdown("---")
-        st.markdown("### 🚀 Available Features:")
-        st.markdown("✅ Style Analysis")
-        st.markdown("✅ Visual Collages (Nova Canvas)")
-        if STYLE_REEL_ENABLED:
-            st.markdown("✅ Style Videos (Nova Reel)")
-        else:
-            st.markdown("🚧 Style Videos (Coming Soon)")
+        st.markdown(SIDEBAR_FEATURES_MD)
+        st.markdown(f"**Session ID:** `{st.session_state.session_id_short}...`")
         
-        # Tips
-        st.markdown("---")
-        st.markdown("### 💡 Tips:")
-        st.markdown("• Use clear, well-lit photos")
-        st.markdown("• Try different style focuses")
-        st.markdown("• Experiment with video prompts")
+        # Feature status and tips
+        st.markdown(SIDEBAR_STATUS_MD)
     
     # Create tabs for different features
     if STYLE_REEL_ENABLED:
@@ -321,12 +642,18 @@ def main():
             )
             
             if uploaded_file is not None:
-                # Display uploaded image
-                st.image(uploaded_file, caption="Your uploaded image", use_column_width=True)
+                # Display uploaded image from a thumbnail decoded once per file
+                if st.session_state.preview_file_id != uploaded_file.file_id:
+                    st.session_state.preview_thumb = make_preview_thumbnail(uploaded_file)
+                    st.session_state.preview_file_id = uploaded_file.file_id
+                st.image(st.session_state.preview_thumb, caption="Your uploaded image", use_column_width=True)
                 
                 # Upload and analyze button
                 if st.button("🔍 Analyze My Style", type="primary", key="analyze_btn"):
                     with st.spinner("Uploading image and analyzing your style..."):
+                        # Re-warm the Lambda in the background while the upload is in flight
+                        warm_lambda()
+                        
                         # Upload to S3
                         s3_key = upload_image_to_s3(uploaded_file)
                         
@@ -334,18 +661,22 @@ def main():
                             # Create S3 URL for agent
                             s3_url = f"https://{S3_BUCKET}.s3.us-east-1.amazonaws.com/{s3_key}"
                             
-                            # Invoke agent for analysis
+                            # Invoke agent for analysis, rendering the reply as it streams
                             analysis_message = f"I want to analyze {s3_url}"
-                            analysis_response = invoke_bedrock_agent(
-                                analysis_message, 
-                                st.session_state.session_id
-                            )
+                            try:
+                                analysis_response = st.write_stream(invoke_bedrock_agent(
+                                    analysis_message, 
+                                    st.session_state.session_id
+                                ))
+                            except Exception:
+                                # Already reported; don't keep a truncated analysis
+                                analysis_response = None
                             
                             if analysis_response:
                                 st.session_state.profile_data = analysis_response
                                 st.session_state.analysis_complete = True
+                                prefetch_results(st.session_state.session_id)
                                 st.success("✅ Analysis complete!")
-                                st.rerun()
         
         with col2:
             st.markdown("### 🎯 Your Style Profile")
@@ -355,13 +686,16 @@ def main():
                 if not st.session_state.recommendations_generated:
                     if st.button("✨ Get My Recommendations", type="primary", key="rec_btn"):
                         with st.spinner("Generating your personalized recommendations..."):
-                            recommendations = generate_recommendations_direct(st.session_state.session_id)
+                            recommendations = generate_recommendations_direct(
+                                st.session_state.session_id,
+                                st.session_state.recommendations_future
+                            )
+                            st.session_state.recommendations_future = None
                             
                             if recommendations:
                                 st.session_state.recommendations_data = recommendations
                                 st.session_state.recommendations_generated = True
                                 st.success("🎉 Your personalized recommendations are ready!")
-                                st.rerun()
                 
                 # Display recommendations prominently if available
                 if st.session_state.recommendations_generated and st.session_state.recommendations_data:
@@ -378,119 +712,16 @@ def main():
     
     # Tab 2: Visual Collages
     with tab2:
-        if st.session_state.analysis_complete:
-            st.markdown("### 🎨 Visual Style Collages")
-            st.markdown("Generate beautiful mood boards focused on specific areas of your lifestyle!")
-            
-            # Category selection
-            collage_categories = {
-                "wardrobe": "👗 Wardrobe & Fashion",
-                "interior": "🏠 Home & Interior Design", 
-                "travel": "✈️ Travel & Experiences",
-                "lifestyle": "🌟 Complete Lifestyle"
-            }
-            
-            selected_category = st.selectbox(
-                "Select collage focus:",
-                options=list(collage_categories.keys()),
-                format_func=lambda x: collage_categories[x],
-                index=0,
-                key="collage_selector"
-            )
-            
-            # Style collage generation button
-            if st.button(f"🎨 Generate {collage_categories[selected_category]} Collage", type="primary", key="collage_btn"):
-                with st.spinner(f"Creating your personalized {collage_categories[selected_category].lower()} collage... This may take a few seconds."):
-                    collage_result = generate_style_collage(st.session_state.session_id, selected_category)
-                    
-                    if collage_result:
-                        st.session_state.collage_data = collage_result
-                        st.session_state.collage_category = selected_category
-                        st.success(f"🎉 Your {collage_categories[selected_category].lower()} collage is ready!")
-                        st.rerun()
-            
-            # Display generated collage
-            if hasattr(st.session_state, 'collage_data') and st.session_state.collage_data:
-                category_name = collage_categories.get(st.session_state.get('collage_category', 'lifestyle'), 'Style')
-                st.markdown(f"#### 🖼️ Your {category_name} Collage:")
-                
-                # Try to display the image using different methods
-                collage_displayed = False
-                
-                # Method 1: Try base64 if available
-                if 'base64' in st.session_state.collage_data:
-                    try:
-                        # Decode base64 image
-                        image_data = base64.b64decode(st.session_state.collage_data['base64'])
-                        
-                        # Display using st.image with BytesIO
-                        st.image(
-                            BytesIO(image_data),
-                            caption=f"Your AI-Generated {category_name} Mood Board", 
-                            use_column_width=True
-                        )
-                        collage_displayed = True
-                        
-                        # Display the prompt used (for troubleshooting)
-                        if 'prompt_used' in st.session_state.collage_data:
-                            with st.expander("🔍 View Prompt Used"):
-                                st.text_area("Prompt for Nova Canvas", 
-                                            st.session_state.collage_data['prompt_used'], 
-                                            height=200)
-                        
-                    except Exception as e:
-                        st.warning(f"Could not display image from base64: {str(e)}")
-                
-                # Method 2: Try URL if base64 failed
-                if not collage_displayed and 'url' in st.session_state.collage_data:
-                    try:
-                        st.image(
-                            st.session_state.collage_data['url'], 
-                            caption=f"Your AI-Generated {category_name} Mood Board", 
-                            use_column_width=True
-                        )
-                        collage_displayed = True
-                        
-                    except Exception as e:
-                        st.warning(f"Could not display image from URL: {str(e)}")
-                
-                # Method 3: Fallback to link
-                if not collage_displayed:
-                    st.error("Could not display image directly. Here's the link:")
-                    if 'url' in st.session_state.collage_data:
-                        st.markdown(f"[🔗 View Your {category_name} Collage]({st.session_state.collage_data['url']})")
-                
-                # Additional options
-                if collage_displayed:
-                    col_a, col_b, col_c = st.columns(3)
-                    
-                    with col_a:
-                        if st.button("🔄 Generate New", key="new_collage_btn"):
-                            with st.spinner(f"Creating a new {collage_categories[st.session_state.collage_category].lower()} collage..."):
-                                new_collage = generate_style_collage(st.session_state.session_id, st.session_state.collage_category)
-                                if new_collage:
-                                    st.session_state.collage_data = new_collage
-                                    st.success("🎉 New collage generated!")
-                                    st.rerun()
-                    
-                    with col_b:
-                        if 'url' in st.session_state.collage_data:
-                            st.markdown(f"[🔗 Full Size]({st.session_state.collage_data['url']})")
-                    
-                    with col_c:
-                        # Category switch button
-                        if st.button("🎯 Change Focus", key="change_focus_btn"):
-                            # Clear current collage to show category selector
-                            if hasattr(st.session_state, 'collage_data'):
-                                del st.session_state.collage_data
-                            st.rerun()
-                
-        else:
-            st.info("Complete your style analysis first to generate visual collages!")
+        render_collage_panel()
+        if st.session_state.collage_job is not None:
+            _poll_collage_result()
     
     # Tab 3: Style Videos (if enabled)
     if STYLE_REEL_ENABLED:
         with tab3:
+            # Imported here so the Nova Reel stack loads after the other tabs
+            # have rendered, and any import error shows inside this tab
+            from style_reel_component import render_style_reel_tab
             render_style_reel_tab(st.session_state.session_id, st.session_state.analysis_complete)
     
     # Footer
@@ -0,0 +1,167 @@
+"""
+Shared AWS clients and S3 upload pipeline for the EssenceMirror apps
+"""
+
+import streamlit as st
+import hashlib
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+
+# orjson parses the Lambda response bodies (which can carry a base64 image)
+# several times faster than the stdlib; fall back to json without it
+try:
+    import orjson
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    import json
+    json_loads = json.loads
+
+    def json_dumps(obj):
+        return json.dumps(obj).encode('utf-8')
+
+def load_json_body(content):
+    """Parse a Lambda application/json body, unpacking it if sent gzip+base64 encoded"""
+    body = content['body']
+    if content.get('encoding') == 'gzip+b64':
+        import base64
+        import gzip
+        body = gzip.decompress(base64.b64decode(body))
+    return json_loads(body)
+
+# Configuration
+S3_BUCKET = "essencemirror-user-uploads"
+MAX_UPLOAD_EDGE = 1280  # longest edge, in pixels, of images sent to S3
+PREVIEW_EDGE = 512  # longest edge of the on-page upload preview
+AGENT_ID = "WWIUY28GRY"
+AGENT_ALIAS_ID = "TSTALIASID"
+
+# Initialize AWS clients. No spinner, so importing this module doesn't
+# emit any Streamlit element before the app's set_page_config.
+@st.cache_resource(show_spinner=False)
+def init_aws_clients():
+    # boto3 is imported here so its service-model loading only happens once
+    # per process, inside the cached resource
+    import boto3
+    from botocore.config import Config
+    # Shared connection settings: a larger keep-alive pool so parallel calls
+    # reuse warm TLS connections instead of re-handshaking
+    cfg = Config(
+        max_pool_connections=50,
+        tcp_keepalive=True,
+        retries={'mode': 'adaptive', 'max_attempts': 5},
+        # Fail fast on connect so adaptive retries kick in instead of a 60s hang
+        connect_timeout=5,
+        read_timeout=60
+    )
+    # Agent replies stream for a long time
+    agent_cfg = cfg.merge(Config(read_timeout=120))
+    return {
+        's3': boto3.client('s3', region_name='us-east-1', config=cfg),
+        'bedrock_agent': boto3.client('bedrock-agent-runtime', region_name='us-east-1', config=agent_cfg),
+        'lambda': boto3.client('lambda', region_name='us-east-1', config=cfg)
+    }
+
+clients = init_aws_clients()
+
+# Shared worker pool for background AWS I/O. Cached as a resource because
+# Streamlit re-executes the app script on every rerun.
+@st.cache_resource
+def get_executor():
+    executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='em')
+    atexit.register(executor.shutdown, wait=False)
+    return executor
+
+# Separate pool for hedged Lambda calls, so a request already running on
+# get_executor() never waits on a worker from its own pool
+@st.cache_resource
+def get_hedge_executor():
+    executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='em-hedge')
+    atexit.register(executor.shutdown, wait=False)
+    return executor
+
+# Built once per process like the clients it is used with
+@st.cache_resource
+def get_transfer_config():
+    from boto3.s3.transfer import TransferConfig
+    # Split larger files into 4MB parts uploaded in parallel
+    return TransferConfig(
+        multipart_threshold=4 * 1024 * 1024,
+        multipart_chunksize=4 * 1024 * 1024,
+        max_concurrency=10,
+        use_threads=True
+    )
+
+LAMBDA_PING_PAYLOAD = b'{"op": "ping"}'
+
+def warm_lambda():
+    """Fire-and-forget ping so the first real request finds a warm Lambda container"""
+    get_executor().submit(
+        clients['lambda'].invoke,
+        FunctionName='essenceMirror',
+        InvocationType='Event',
+        Payload=LAMBDA_PING_PAYLOAD
+    )
+
+def prepare_image_for_upload(uploaded_file):
+    """Downscale the image and re-encode it as WebP to shrink the upload"""
+    # Imported here so sessions that never upload don't pay for PIL at startup
+    from io import BytesIO
+    from PIL import Image, ImageOps
+    img = ImageOps.exif_transpose(Image.open(uploaded_file))
+    img.thumbnail((MAX_UPLOAD_EDGE, MAX_UPLOAD_EDGE), Image.LANCZOS)
+    buf = BytesIO()
+    img.convert('RGB').save(buf, 'WEBP', quality=85, method=4)
+    buf.seek(0)
+    uploaded_file.seek(0)
+    return buf
+
+def make_preview_thumbnail(uploaded_file):
+    """Return a small WebP preview of the upload for st.image"""
+    from io import BytesIO
+    from PIL import Image, ImageOps
+    img = ImageOps.exif_transpose(Image.open(uploaded_file))
+    img.thumbnail((PREVIEW_EDGE, PREVIEW_EDGE))
+    buf = BytesIO()
+    img.convert('RGB').save(buf, 'WEBP', quality=80)
+    uploaded_file.seek(0)
+    return buf.getvalue()
+
+def file_digest(uploaded_file):
+    """Return the SHA-256 hex digest of the uploaded file's bytes"""
+    # UploadedFile is a BytesIO, so hash its buffer in place instead of copying chunks
+    with uploaded_file.getbuffer() as view:
+        return hashlib.sha256(view).hexdigest()
+
+def upload_image_to_s3(uploaded_file):
+    """Upload image to S3 and return the key"""
+    try:
+        # Same bytes as the last upload in this session: reuse its key
+        digest = file_digest(uploaded_file)
+        if digest == st.session_state.get('upload_digest') and st.session_state.get('s3_key'):
+            return st.session_state.s3_key
+
+        # Content-addressed key, so identical images map to one object
+        s3_key = f"uploads/streamlit_{digest}.webp"
+        try:
+            clients['s3'].head_object(Bucket=S3_BUCKET, Key=s3_key)
+            exists = True
+        except clients['s3'].exceptions.ClientError:
+            exists = False
+
+        if not exists:
+            # Upload a resized WebP copy; the analysis models don't need full resolution
+            clients['s3'].upload_fileobj(
+                prepare_image_for_upload(uploaded_file),
+                S3_BUCKET,
+                s3_key,
+                ExtraArgs={'ContentType': 'image/webp'},
+                Config=get_transfer_config()
+            )
+
+        st.session_state.upload_digest = digest
+        st.session_state.s3_key = s3_key
+        return s3_key
+    except Exception as e:
+        st.error(f"Error uploading image: {str(e)}")
+        return None
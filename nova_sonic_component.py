@@ -7,27 +7,30 @@ import streamlit as st
 import asyncio
 import os
 import sys
-import json
-import time
-import uuid
-import tempfile
-from datetime import datetime
 import logging
-import threading
-from typing import Optional, Dict, Any
+import queue
+import time
+from concurrent.futures import wait
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging, unless the host app already has
+if not logging.getLogger().handlers:
+    logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Add the current directory to the path for imports
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# Add the current directory to the path for imports (guarded, since
+# Streamlit re-executes this module and would otherwise grow sys.path)
+_HERE = os.path.dirname(os.path.abspath(__file__))
+if _HERE not in sys.path:
+    sys.path.insert(0, _HERE)
+
+# Infrastructure checkout for local development, opt-in via environment
+_INFRA_PATH = os.environ.get('ESSENCE_INFRA_PATH')
+if _INFRA_PATH and _INFRA_PATH not in sys.path:
+    sys.path.append(_INFRA_PATH)
 
 # Try to import Nova Sonic dependencies
 try:
-    # Add infrastructure path for local development
-    sys.path.append('/Users/kirubelaklilu/Documents/EssenceMirror/essence-mirror-infrastructure')
-    from nova_sonic_style_generator import NovaSonicStyleGenerator, NOVA_SONIC_AVAILABLE
+    from nova_sonic_style_generator import NovaSonicStyleGenerator, NOVA_SONIC_AVAILABLE, create_bedrock_client
     NOVA_SONIC_COMPONENT_AVAILABLE = True
 except ImportError as e:
     st.error(f"Error importing Nova Sonic generator: {str(e)}")
@@ -42,6 +45,53 @@ VOICE_OPTIONS = {
     "Amy": "👩 Amy - Elegant Female (British)",
     "Brian": "👨 Brian - Authoritative Male (British)"
 }
+_VOICE_KEYS = tuple(VOICE_OPTIONS)
+_VOICE_FMT = VOICE_OPTIONS.__getitem__
+
+# Messages shown directly in the conversation; older ones go in an expander
+HISTORY_WINDOW = 20
+
+# One event loop, running for the life of the process, drives every Nova Sonic
+# session so the bidirectional stream stays on the loop it was opened on
+@st.cache_resource
+def _get_event_loop():
+    # Only needed once someone starts a voice session
+    import threading
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name='nova-sonic-loop', daemon=True).start()
+    return loop
+
+# The Bedrock runtime client is the expensive part of a session, so build it
+# once per process; each voice session still gets its own generator and stream
+@st.cache_resource(show_spinner=False)
+def _get_bedrock_client():
+    setup_aws_credentials()
+    client = create_bedrock_client()
+    if client is None:
+        # Raise rather than return None so a failure isn't cached
+        raise RuntimeError("Nova Sonic client could not be initialized")
+    return client
+
+def _run_on_loop(coro, timeout):
+    """Run a coroutine on the shared loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_event_loop()).result(timeout=timeout)
+
+def _run_with_progress(coro, status, progress, timeout):
+    """Run a coroutine on the shared loop, echoing queued progress messages into a status box"""
+    future = asyncio.run_coroutine_threadsafe(coro, _get_event_loop())
+    deadline = time.monotonic() + timeout
+    while not wait([future], timeout=0.1).done:
+        _drain_progress(progress, status)
+        if time.monotonic() > deadline:
+            future.cancel()
+            raise TimeoutError("Nova Sonic did not respond in time")
+    _drain_progress(progress, status)
+    return future.result()
+
+def _drain_progress(progress, status):
+    """Write any progress messages waiting in the queue"""
+    while not progress.empty():
+        status.write(progress.get_nowait())
 
 def render_nova_sonic_tab(session_id, analysis_complete, style_analysis_data=None):
     """Render the Nova Sonic bidirectional audio tab"""
@@ -84,8 +134,8 @@ def render_nova_sonic_tab(session_id, analysis_complete, style_analysis_data=Non
     st.markdown("#### 🎙️ Choose Your AI Style Consultant")
     selected_voice = st.selectbox(
         "Select your preferred voice:",
-        options=list(VOICE_OPTIONS.keys()),
-        format_func=lambda x: VOICE_OPTIONS[x],
+        options=_VOICE_KEYS,
+        format_func=_VOICE_FMT,
         index=0,  # Default to Joanna
         help="Choose the voice for your AI style consultant"
     )
@@ -97,31 +147,36 @@ def render_nova_sonic_tab(session_id, analysis_complete, style_analysis_data=Non
     st.markdown("#### 🎤 Voice Conversation")
     
     # Initialize session state for Nova Sonic
-    if 'nova_sonic_session' not in st.session_state:
-        st.session_state.nova_sonic_session = None
-    if 'nova_sonic_active' not in st.session_state:
-        st.session_state.nova_sonic_active = False
-    if 'conversation_history' not in st.session_state:
-        st.session_state.conversation_history = []
+    st.session_state.setdefault('nova_sonic_session', None)
+    st.session_state.setdefault('nova_sonic_active', False)
+    history = st.session_state.setdefault('conversation_history', [])
+    
+    # Start/End callbacks only record the request; it runs here so its
+    # progress shows in this tab, before the controls below are drawn
+    action = st.session_state.pop('nova_sonic_action', None)
+    if action == 'start':
+        start_nova_sonic_session(selected_voice, session_id)
+    elif action == 'end':
+        end_nova_sonic_session()
+    active = st.session_state.nova_sonic_active
     
     # Session controls
     col1, col2, col3 = st.columns([1, 1, 1])
     
     with col1:
-        if st.button("🎙️ Start Voice Session", type="primary", disabled=st.session_state.nova_sonic_active):
-            start_nova_sonic_session(selected_voice, session_id)
+        st.button("🎙️ Start Voice Session", type="primary", disabled=active,
+                  on_click=_request_action, args=('start',))
     
     with col2:
-        if st.button("⏹️ End Session", disabled=not st.session_state.nova_sonic_active):
-            end_nova_sonic_session()
+        st.button("⏹️ End Session", disabled=not active,
+                  on_click=_request_action, args=('end',))
     
     with col3:
         if st.button("🔄 Reset Conversation"):
-            st.session_state.conversation_history = []
-            st.rerun()
+            history.clear()
     
     # Session status
-    if st.session_state.nova_sonic_active:
+    if active:
         st.success("🟢 Voice session active - You can now speak!")
     else:
         st.info("🔴 Voice session inactive - Click 'Start Voice Session' to begin")
@@ -130,35 +185,27 @@ def render_nova_sonic_tab(session_id, analysis_complete, style_analysis_data=Non
     st.markdown("#### 💬 Text Input (Testing Mode)")
     st.info("Use text input to test the conversation while we work on microphone integration")
     
-    text_input = st.text_input(
-        "Type your style question:",
-        placeholder="e.g., 'I need help choosing an outfit for a job interview'",
-        disabled=not st.session_state.nova_sonic_active
-    )
+    # A form, so typing doesn't rerun the tab on every keystroke
+    with st.form("nova_sonic_input", clear_on_submit=True):
+        text_input = st.text_input(
+            "Type your style question:",
+            placeholder="e.g., 'I need help choosing an outfit for a job interview'",
+            disabled=not active
+        )
+        submitted = st.form_submit_button("📤 Send Text Message", disabled=not active)
     
-    if st.button("📤 Send Text Message", disabled=not st.session_state.nova_sonic_active or not text_input):
+    if submitted and text_input:
         send_text_to_nova_sonic(text_input)
     
     # Conversation history
-    if st.session_state.conversation_history:
+    if history:
         st.markdown("#### 💭 Conversation History")
         
-        for i, message in enumerate(st.session_state.conversation_history):
-            if message['role'] == 'user':
-                st.markdown(f"**👤 You:** {message['content']}")
-            else:
-                st.markdown(f"**🎙️ Style Consultant:** {message['content']}")
-                
-                # Show audio player if available
-                if 'audio_file' in message:
-                    try:
-                        with open(message['audio_file'], 'rb') as audio_file:
-                            audio_bytes = audio_file.read()
-                            st.audio(audio_bytes, format='audio/wav')
-                    except Exception as e:
-                        st.error(f"Error playing audio: {str(e)}")
-            
-            st.markdown("---")
+        if len(history) > HISTORY_WINDOW:
+            with st.expander(f"Show earlier history ({len(history) - HISTORY_WINDOW} messages)"):
+                _render_messages(history[:-HISTORY_WINDOW])
+        _render_messages(history[-HISTORY_WINDOW:])
+        st.markdown("---")
     
     # Instructions and tips
     st.markdown("#### 💡 How to Use Voice Conversations")
@@ -183,170 +230,239 @@ def render_nova_sonic_tab(session_id, analysis_complete, style_analysis_data=Non
     - Natural, encouraging conversation style
     """)
 
+def _request_action(action):
+    """Button callback: record a Start/End request for the tab body to carry out"""
+    st.session_state.nova_sonic_action = action
+
+def _pcm_to_wav(pcm_bytes):
+    """Wrap Nova Sonic's raw LPCM output in a WAV header, in memory"""
+    import io
+    import wave
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as wav:
+        # Matches the audioOutputConfiguration the generator requests
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(24000)
+        wav.writeframes(pcm_bytes)
+    return buf.getvalue()
+
+def _render_messages(messages):
+    """Render messages as one markdown block, split only where an audio player goes"""
+    lines = []
+    for message in messages:
+        if message['role'] == 'user':
+            lines.append(f"**👤 You:** {message['content']}")
+        else:
+            lines.append(f"**🎙️ Style Consultant:** {message['content']}")
+            
+            # Show audio player if available
+            if 'audio_bytes' in message:
+                st.markdown("\n\n".join(lines))
+                lines = []
+                st.audio(message['audio_bytes'], format='audio/wav')
+    if lines:
+        st.markdown("\n\n".join(lines))
+
 def start_nova_sonic_session(voice_id: str, session_id: str):
     """Start a Nova Sonic voice session"""
-    try:
-        with st.spinner("🎙️ Starting voice session with AI style consultant..."):
-            # Set AWS credentials for Nova Sonic
+    with st.status("🎙️ Starting voice session with AI style consultant...", expanded=True) as status:
+        try:
+            status.write("Connecting to Nova Sonic...")
+            # Refresh temporary credentials before opening a new stream
             setup_aws_credentials()
+            client = _get_bedrock_client()
             
-            # Create Nova Sonic generator
-            generator = NovaSonicStyleGenerator()
+            # Steps reported from the loop thread, written out by this one
+            progress = queue.Queue()
             
-            # Start session in a separate thread (since Streamlit doesn't support async directly)
-            def start_session():
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                success = loop.run_until_complete(generator.start_style_session(voice_id))
-                loop.close()
+            # Create the generator on the shared loop so its queues belong to it
+            async def start_session():
+                generator = NovaSonicStyleGenerator()
+                generator.client = client
+                success = await generator.start_style_session(voice_id, progress=progress.put)
                 return success, generator
             
-            # Run in thread
-            import concurrent.futures
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(start_session)
-                success, generator = future.result(timeout=30)
+            success, generator = _run_with_progress(start_session(), status, progress, timeout=30)
             
             if success:
                 st.session_state.nova_sonic_session = generator
                 st.session_state.nova_sonic_active = True
-                st.success(f"✅ Voice session started with {voice_id}!")
-                st.rerun()
+                status.update(label=f"✅ Voice session started with {voice_id}!", state="complete", expanded=False)
             else:
-                st.error("❌ Failed to start voice session")
-                
-    except Exception as e:
-        st.error(f"❌ Error starting voice session: {str(e)}")
-        logger.error(f"Nova Sonic session start error: {str(e)}")
+                status.update(label="❌ Failed to start voice session", state="error")
+                    
+        except Exception as e:
+            status.update(label=f"❌ Error starting voice session: {str(e)}", state="error")
+            logger.error("Nova Sonic session start error: %s", e)
 
 def end_nova_sonic_session():
     """End the Nova Sonic voice session"""
-    try:
-        if st.session_state.nova_sonic_session:
-            with st.spinner("⏹️ Ending voice session..."):
-                # End session in thread
-                def end_session():
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    loop.run_until_complete(st.session_state.nova_sonic_session.end_session())
-                    loop.close()
-                
-                import concurrent.futures
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    future = executor.submit(end_session)
-                    future.result(timeout=10)
-                
-                st.session_state.nova_sonic_session = None
-                st.session_state.nova_sonic_active = False
-                st.success("✅ Voice session ended")
-                st.rerun()
+    generator = st.session_state.nova_sonic_session
+    if not generator:
+        return
+    with st.status("⏹️ Ending voice session...") as status:
+        try:
+            _run_on_loop(generator.end_session(), timeout=10)
+            
+            st.session_state.nova_sonic_session = None
+            st.session_state.nova_sonic_active = False
+            status.update(label="✅ Voice session ended", state="complete")
                 
-    except Exception as e:
-        st.error(f"❌ Error ending voice session: {str(e)}")
-        logger.error(f"Nova Sonic session end error: {str(e)}")
+        except Exception as e:
+            status.update(label=f"❌ Error ending voice session: {str(e)}", state="error")
+            logger.error("Nova Sonic session end error: %s", e)
 
 def send_text_to_nova_sonic(message: str):
     """Send text message to Nova Sonic and get response"""
     try:
-        if not st.session_state.nova_sonic_session or not st.session_state.nova_sonic_active:
+        generator = st.session_state.nova_sonic_session
+        if not generator or not st.session_state.nova_sonic_active:
             st.error("❌ No active voice session")
             return
+        history = st.session_state.conversation_history
         
         with st.spinner("🎙️ AI Style Consultant is thinking..."):
             # Add user message to history
-            st.session_state.conversation_history.append({
+            history.append({
                 'role': 'user',
                 'content': message,
-                'timestamp': datetime.now().isoformat()
+                # Epoch seconds; format with datetime.fromtimestamp if ever displayed
+                'timestamp': time.time()
             })
             
-            # Send message and get response in thread
-            def send_and_receive():
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
+            # Send message and get response on the session's loop
+            async def send_and_receive():
                 # Send message
-                success = loop.run_until_complete(
-                    st.session_state.nova_sonic_session.send_text_message(message)
-                )
+                success = await generator.send_text_message(message)
                 
                 if success:
-                    # Get text response
-                    text_response = loop.run_until_complete(
-                        st.session_state.nova_sonic_session.get_response(timeout=15.0)
-                    )
-                    
-                    # Get audio response
-                    audio_response = loop.run_until_complete(
-                        st.session_state.nova_sonic_session.get_audio_response(timeout=10.0)
+                    # Text and audio events arrive on the stream together, so wait for
+                    # both at once; the audio reply is drained until it goes quiet
+                    return await asyncio.gather(
+                        generator.get_response(timeout=15.0),
+                        generator.get_audio_reply(timeout=10.0)
                     )
-                    
-                    loop.close()
-                    return text_response, audio_response
                 else:
-                    loop.close()
                     return None, None
             
-            import concurrent.futures
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(send_and_receive)
-                text_response, audio_response = future.result(timeout=30)
+            text_response, audio_reply = _run_on_loop(send_and_receive(), timeout=60)
             
             # Process responses
             if text_response:
                 response_data = {
                     'role': 'assistant',
                     'content': text_response['content'],
-                    'timestamp': text_response['timestamp']
+                    'timestamp': time.time()
                 }
                 
-                # Save audio if available
-                if audio_response:
-                    timestamp = datetime.now().strftime('%H%M%S')
-                    audio_file = f"nova_sonic_response_{timestamp}.wav"
-                    
-                    with open(audio_file, 'wb') as f:
-                        f.write(audio_response['content'])
-                    
-                    response_data['audio_file'] = audio_file
+                # Keep the audio in memory with the message
+                if audio_reply:
+                    response_data['audio_bytes'] = _pcm_to_wav(audio_reply)
                 
-                st.session_state.conversation_history.append(response_data)
+                history.append(response_data)
                 st.success("✅ Response received!")
-                st.rerun()
             else:
                 st.error("❌ No response received from AI consultant")
                 
     except Exception as e:
         st.error(f"❌ Error in conversation: {str(e)}")
-        logger.error(f"Nova Sonic conversation error: {str(e)}")
+        logger.error("Nova Sonic conversation error: %s", e)
+
+def _read_aws_config_files():
+    """Read the active profile's keys and region straight from ~/.aws"""
+    import configparser
+    profile = os.environ.get('AWS_PROFILE', 'default')
+    creds = configparser.ConfigParser()
+    creds.read(os.path.expanduser('~/.aws/credentials'))
+    config = configparser.ConfigParser()
+    config.read(os.path.expanduser('~/.aws/config'))
+    section = profile if profile == 'default' else f'profile {profile}'
+    return (
+        creds.get(profile, 'aws_access_key_id', fallback=None),
+        creds.get(profile, 'aws_secret_access_key', fallback=None),
+        creds.get(profile, 'aws_session_token', fallback=None),
+        config.get(section, 'region', fallback=None)
+    )
+
+# Credentials resolved by _get_credentials, with their region
+_AWS_CREDENTIALS = None
+
+def _get_credentials():
+    """Resolve the credential chain, the same one the AWS CLI uses
+    
+    Kept once found; refreshable (SSO/role) credentials renew themselves.
+    Tried again on every call until some are configured, so a later
+    `aws sso login` or exported keys are picked up without a restart.
+    """
+    global _AWS_CREDENTIALS
+    if _AWS_CREDENTIALS is None:
+        import boto3
+        session = boto3.Session()
+        credentials = session.get_credentials()
+        if credentials is None:
+            return None, session.region_name
+        _AWS_CREDENTIALS = credentials, session.region_name
+    return _AWS_CREDENTIALS
+
+def _resolve_aws_credentials():
+    """Resolve current credentials in-process, refreshing them near expiry"""
+    try:
+        credentials, region = _get_credentials()
+    except ImportError:
+        return _read_aws_config_files()
+    if credentials is None:
+        return None, None, None, region
+    frozen = credentials.get_frozen_credentials()
+    return frozen.access_key, frozen.secret_key, frozen.token, region
+
+# Set once long-lived keys are in the environment; temporary ones are
+# re-exported on every call so a long-running app never uses expired keys
+_AWS_READY = False
+# Access key and token this module last put in the environment
+_AWS_EXPORTED = None
 
 def setup_aws_credentials():
     """Setup AWS credentials for Nova Sonic"""
+    global _AWS_READY, _AWS_EXPORTED
+    if _AWS_READY:
+        return True
     try:
-        # Check if credentials are already set
-        if os.environ.get('AWS_ACCESS_KEY_ID') and os.environ.get('AWS_SECRET_ACCESS_KEY'):
+        # Check if credentials are already set (outside this app)
+        if (_AWS_EXPORTED is None and os.environ.get('AWS_ACCESS_KEY_ID')
+                and os.environ.get('AWS_SECRET_ACCESS_KEY')):
+            _AWS_READY = True
             return True
         
-        # Try to get from AWS CLI configuration
-        import subprocess
-        try:
-            access_key = subprocess.check_output(['aws', 'configure', 'get', 'aws_access_key_id']).decode().strip()
-            secret_key = subprocess.check_output(['aws', 'configure', 'get', 'aws_secret_access_key']).decode().strip()
-            region = subprocess.check_output(['aws', 'configure', 'get', 'region']).decode().strip()
-            
-            os.environ['AWS_ACCESS_KEY_ID'] = access_key
-            os.environ['AWS_SECRET_ACCESS_KEY'] = secret_key
-            os.environ['AWS_DEFAULT_REGION'] = region
-            
-            logger.info("AWS credentials set from CLI configuration")
-            return True
-            
-        except subprocess.CalledProcessError:
-            logger.error("Failed to get AWS credentials from CLI")
+        access_key, secret_key, token, region = _resolve_aws_credentials()
+        if not (access_key and secret_key):
+            logger.error("Failed to resolve AWS credentials")
             return False
+        
+        if _AWS_EXPORTED == (access_key, token):
+            return True
+        
+        os.environ['AWS_ACCESS_KEY_ID'] = access_key
+        os.environ['AWS_SECRET_ACCESS_KEY'] = secret_key
+        if token:
+            os.environ['AWS_SESSION_TOKEN'] = token
+        else:
+            os.environ.pop('AWS_SESSION_TOKEN', None)
+        if region:
+            os.environ['AWS_DEFAULT_REGION'] = region
+        
+        if _AWS_EXPORTED is not None:
+            # Credentials were renewed; rebuild the client with the new keys
+            _get_bedrock_client.clear()
+        _AWS_EXPORTED = (access_key, token)
+        
+        logger.info("AWS credentials set from local AWS configuration")
+        # Long-lived keys never expire, so they only need exporting once
+        _AWS_READY = token is None
+        return True
             
     except Exception as e:
-        logger.error(f"Error setting up AWS credentials: {str(e)}")
+        logger.error("Error setting up AWS credentials: %s", e)
         return False
 
 def test_nova_sonic_component():
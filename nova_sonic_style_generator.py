@@ -6,13 +6,25 @@ Bidirectional audio conversation system for style recommendations
 
 import os
 import asyncio
-import base64
-import json
-import uuid
+import binascii
+import itertools
+import time
 import logging
-from datetime import datetime
 from typing import Optional, Dict, Any, List
 
+# orjson works on bytes directly, which is what the stream sends and receives;
+# fall back to the stdlib without it
+try:
+    import orjson
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    import json
+    json_loads = json.loads
+
+    def json_dumps(obj):
+        return json.dumps(obj).encode('utf-8')
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -28,6 +40,106 @@ except ImportError as e:
     logger.error(f"Nova Sonic dependencies not available: {str(e)}")
     NOVA_SONIC_AVAILABLE = False
 
+def create_bedrock_client(region='us-east-1'):
+    """Build a Bedrock runtime client for Nova Sonic; sessions can share one"""
+    try:
+        # Ensure environment variables are set
+        if not os.environ.get('AWS_ACCESS_KEY_ID') or not os.environ.get('AWS_SECRET_ACCESS_KEY'):
+            logger.error("AWS credentials not found in environment variables")
+            return None
+        
+        config = Config(
+            endpoint_uri=f"https://bedrock-runtime.{region}.amazonaws.com",
+            region=region,
+            aws_credentials_identity_resolver=EnvironmentCredentialsResolver(),
+            http_auth_scheme_resolver=HTTPAuthSchemeResolver(),
+            http_auth_schemes={"aws.auth#sigv4": SigV4AuthScheme()}
+        )
+        client = BedrockRuntimeClient(config=config)
+        logger.info("Nova Sonic client initialized successfully")
+        return client
+        
+    except Exception as e:
+        logger.error(f"Failed to initialize Nova Sonic client: {str(e)}")
+        return None
+
+# Style consultant system prompt
+STYLE_SYSTEM_PROMPT = """You are EssenceMirror's AI style consultant - a professional, encouraging, and knowledgeable fashion advisor. 
+
+Your expertise includes:
+- Personal style analysis and recommendations
+- Color theory and seasonal palettes
+- Body type and fit guidance
+- Occasion-appropriate styling
+- Confidence building through fashion
+
+Your conversation style:
+- Warm, supportive, and professional
+- Ask clarifying questions about preferences, lifestyle, and occasions
+- Provide specific, actionable recommendations
+- Keep responses conversational and encouraging
+- Focus on building the user's confidence and personal style
+
+Remember: Every person has their own unique style - help them discover and embrace it!"""
+
+# Events that never change, serialised once
+SESSION_START_EVENT = json_dumps({
+    "event": {
+        "sessionStart": {
+            "inferenceConfiguration": {
+                "maxTokens": 1024,
+                "topP": 0.9,
+                "temperature": 0.7
+            }
+        }
+    }
+})
+SESSION_END_EVENT = json_dumps({"event": {"sessionEnd": {}}})
+
+# Names only have to be unique within one session's stream, so every session
+# uses the same ones and shares the pre-serialised events below
+PROMPT_NAME = "prompt"
+SYSTEM_CONTENT_NAME = "system"
+AUDIO_CONTENT_NAME = "user_audio"
+
+# Templates for events with a varying part; the %s slots take JSON-encoded
+# bytes, e.g. json_dumps(content_name)
+_PROMPT_JSON = json_dumps(PROMPT_NAME)
+_TEXT_START_TPL = (
+    b'{"event":{"contentStart":{"promptName":' + _PROMPT_JSON +
+    b',"contentName":%s,"type":"TEXT","interactive":true,"role":%s,'
+    b'"textInputConfiguration":{"mediaType":"text/plain"}}}}'
+)
+_TEXT_INPUT_TPL = (
+    b'{"event":{"textInput":{"promptName":' + _PROMPT_JSON + b',"contentName":%s,"content":%s}}}'
+)
+_CONTENT_END_TPL = (
+    b'{"event":{"contentEnd":{"promptName":' + _PROMPT_JSON + b',"contentName":%s}}}'
+)
+# Audio chunks are the hot path: prefix + base64 + suffix, no formatting.
+# Base64 needs no JSON escaping, so the quotes live in the template.
+_AUDIO_INPUT_PREFIX = (
+    b'{"event":{"audioInput":{"promptName":' + _PROMPT_JSON +
+    b',"contentName":' + json_dumps(AUDIO_CONTENT_NAME) + b',"content":"'
+)
+_AUDIO_INPUT_SUFFIX = b'"}}}'
+AUDIO_CONTENT_END_EVENT = _CONTENT_END_TPL % json_dumps(AUDIO_CONTENT_NAME)
+PROMPT_END_EVENT = b'{"event":{"promptEnd":{"promptName":' + _PROMPT_JSON + b'}}}'
+
+def _text_content_events(content_name: str, role: bytes, content: bytes):
+    """contentStart, textInput and contentEnd events for one text block (role and content JSON-encoded)"""
+    name = json_dumps(content_name)
+    return (
+        _TEXT_START_TPL % (name, role),
+        _TEXT_INPUT_TPL % (name, content),
+        _CONTENT_END_TPL % name
+    )
+
+# The system prompt block is the same for every session
+SYSTEM_PROMPT_EVENTS = _text_content_events(
+    SYSTEM_CONTENT_NAME, b'"SYSTEM"', json_dumps(STYLE_SYSTEM_PROMPT)
+)
+
 class NovaSonicStyleGenerator:
     """Nova Sonic generator for EssenceMirror style conversations"""
     
@@ -37,11 +149,16 @@ class NovaSonicStyleGenerator:
         self.client = None
         self.stream = None
         self.is_active = False
-        self.prompt_name = str(uuid.uuid4())
-        self.content_name = str(uuid.uuid4())
-        self.audio_content_name = str(uuid.uuid4())
+        self.prompt_name = PROMPT_NAME
+        self.content_name = SYSTEM_CONTENT_NAME
+        self.audio_content_name = AUDIO_CONTENT_NAME
+        # Numbers this session's user text blocks
+        self._names = itertools.count()
+        self._audio_started = False
+        # Text items are small, so only the audio queue is bounded; when it is
+        # full the reader waits for the consumer (see _put_audio)
         self.response_queue = asyncio.Queue()
-        self.audio_queue = asyncio.Queue()
+        self.audio_queue = asyncio.Queue(maxsize=64)
         
         # Voice configuration
         self.voice_options = {
@@ -54,33 +171,20 @@ class NovaSonicStyleGenerator:
         
     def _initialize_client(self):
         """Initialize the Nova Sonic client"""
-        try:
-            # Ensure environment variables are set
-            if not os.environ.get('AWS_ACCESS_KEY_ID') or not os.environ.get('AWS_SECRET_ACCESS_KEY'):
-                logger.error("AWS credentials not found in environment variables")
-                return False
-            
-            config = Config(
-                endpoint_uri=f"https://bedrock-runtime.{self.region}.amazonaws.com",
-                region=self.region,
-                aws_credentials_identity_resolver=EnvironmentCredentialsResolver(),
-                http_auth_scheme_resolver=HTTPAuthSchemeResolver(),
-                http_auth_schemes={"aws.auth#sigv4": SigV4AuthScheme()}
-            )
-            self.client = BedrockRuntimeClient(config=config)
-            logger.info("Nova Sonic client initialized successfully")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Failed to initialize Nova Sonic client: {str(e)}")
-            return False
+        self.client = create_bedrock_client(self.region)
+        return self.client is not None
     
     async def send_event(self, event_data: Dict[str, Any]) -> bool:
         """Send an event to the bidirectional stream"""
+        return await self._send_bytes(json_dumps(event_data))
+    
+    async def _send_bytes(self, payload: bytes) -> bool:
+        """Send an already-serialised event to the bidirectional stream"""
         try:
-            event_json = json.dumps(event_data)
+            # A fresh wrapper per send: the stream may serialise it after
+            # send() returns, so a shared one could be overwritten
             event = InvokeModelWithBidirectionalStreamInputChunk(
-                value=BidirectionalInputPayloadPart(bytes_=event_json.encode('utf-8'))
+                value=BidirectionalInputPayloadPart(bytes_=payload)
             )
             await self.stream.input_stream.send(event)
             return True
@@ -88,8 +192,11 @@ class NovaSonicStyleGenerator:
             logger.error(f"Failed to send event: {str(e)}")
             return False
     
-    async def start_style_session(self, voice_id: Optional[str] = None) -> bool:
-        """Start a Nova Sonic session for style conversations"""
+    async def start_style_session(self, voice_id: Optional[str] = None, progress=None) -> bool:
+        """Start a Nova Sonic session for style conversations
+        
+        progress, if given, is called with a short message as each setup step begins.
+        """
         try:
             if not NOVA_SONIC_AVAILABLE:
                 logger.error("Nova Sonic dependencies not available")
@@ -100,6 +207,8 @@ class NovaSonicStyleGenerator:
                     return False
             
             # Initialize bidirectional stream
+            if progress:
+                progress("Opening voice stream...")
             self.stream = await self.client.invoke_model_with_bidirectional_stream(
                 InvokeModelWithBidirectionalStreamOperationInput(model_id=self.model_id)
             )
@@ -110,17 +219,9 @@ class NovaSonicStyleGenerator:
             selected_voice = voice_id if voice_id in self.voice_options else self.default_voice
             
             # Send session start
-            await self.send_event({
-                "event": {
-                    "sessionStart": {
-                        "inferenceConfiguration": {
-                            "maxTokens": 1024,
-                            "topP": 0.9,
-                            "temperature": 0.7
-                        }
-                    }
-                }
-            })
+            if progress:
+                progress(f"Configuring voice {selected_voice}...")
+            await self._send_bytes(SESSION_START_EVENT)
             
             # Send prompt start with audio configuration
             await self.send_event({
@@ -144,6 +245,8 @@ class NovaSonicStyleGenerator:
             })
             
             # Send style-focused system prompt
+            if progress:
+                progress("Briefing your style consultant...")
             await self._send_style_system_prompt()
             
             # Start response processing
@@ -156,64 +259,21 @@ class NovaSonicStyleGenerator:
             logger.error(f"Failed to start style session: {str(e)}")
             return False
     
+    async def _send_all(self, payloads) -> bool:
+        """Send pre-built events in order, stopping at the first failure
+        
+        The stream takes one event per chunk, in order, so a content block's
+        events can't be merged into one frame or sent concurrently.
+        """
+        for payload in payloads:
+            if not await self._send_bytes(payload):
+                return False
+        return True
+    
     async def _send_style_system_prompt(self):
         """Send system prompt optimized for style conversations"""
         try:
-            # Start system content
-            await self.send_event({
-                "event": {
-                    "contentStart": {
-                        "promptName": self.prompt_name,
-                        "contentName": self.content_name,
-                        "type": "TEXT",
-                        "interactive": True,
-                        "role": "SYSTEM",
-                        "textInputConfiguration": {
-                            "mediaType": "text/plain"
-                        }
-                    }
-                }
-            })
-            
-            # Style consultant system prompt
-            system_prompt = """You are EssenceMirror's AI style consultant - a professional, encouraging, and knowledgeable fashion advisor. 
-
-Your expertise includes:
-- Personal style analysis and recommendations
-- Color theory and seasonal palettes
-- Body type and fit guidance
-- Occasion-appropriate styling
-- Confidence building through fashion
-
-Your conversation style:
-- Warm, supportive, and professional
-- Ask clarifying questions about preferences, lifestyle, and occasions
-- Provide specific, actionable recommendations
-- Keep responses conversational and encouraging
-- Focus on building the user's confidence and personal style
-
-Remember: Every person has their own unique style - help them discover and embrace it!"""
-            
-            # Send system prompt
-            await self.send_event({
-                "event": {
-                    "textInput": {
-                        "promptName": self.prompt_name,
-                        "contentName": self.content_name,
-                        "content": system_prompt
-                    }
-                }
-            })
-            
-            # End system content
-            await self.send_event({
-                "event": {
-                    "contentEnd": {
-                        "promptName": self.prompt_name,
-                        "contentName": self.content_name
-                    }
-                }
-            })
+            await self._send_all(SYSTEM_PROMPT_EVENTS)
             
             logger.info("Style system prompt configured")
             
@@ -223,44 +283,10 @@ Remember: Every person has their own unique style - help them discover and embra
     async def send_text_message(self, message: str) -> bool:
         """Send a text message to Nova Sonic"""
         try:
-            content_name = f"user_text_{uuid.uuid4()}"
-            
-            # Start user content
-            await self.send_event({
-                "event": {
-                    "contentStart": {
-                        "promptName": self.prompt_name,
-                        "contentName": content_name,
-                        "type": "TEXT",
-                        "interactive": True,
-                        "role": "USER",
-                        "textInputConfiguration": {
-                            "mediaType": "text/plain"
-                        }
-                    }
-                }
-            })
-            
-            # Send message
-            await self.send_event({
-                "event": {
-                    "textInput": {
-                        "promptName": self.prompt_name,
-                        "contentName": content_name,
-                        "content": message
-                    }
-                }
-            })
-            
-            # End user content
-            await self.send_event({
-                "event": {
-                    "contentEnd": {
-                        "promptName": self.prompt_name,
-                        "contentName": content_name
-                    }
-                }
-            })
+            if not await self._send_all(_text_content_events(
+                f"user_text_{next(self._names)}", b'"USER"', json_dumps(message)
+            )):
+                return False
             
             logger.info(f"Text message sent: {message[:50]}...")
             return True
@@ -276,7 +302,7 @@ Remember: Every person has their own unique style - help them discover and embra
                 return False
             
             # Start audio content if not already started
-            if not hasattr(self, '_audio_started'):
+            if not self._audio_started:
                 await self.send_event({
                     "event": {
                         "contentStart": {
@@ -299,16 +325,11 @@ Remember: Every person has their own unique style - help them discover and embra
                 self._audio_started = True
             
             # Send audio chunk
-            audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
-            await self.send_event({
-                "event": {
-                    "audioInput": {
-                        "promptName": self.prompt_name,
-                        "contentName": self.audio_content_name,
-                        "content": audio_base64
-                    }
-                }
-            })
+            await self._send_bytes(
+                _AUDIO_INPUT_PREFIX
+                + binascii.b2a_base64(audio_bytes, newline=False)
+                + _AUDIO_INPUT_SUFFIX
+            )
             
             return True
             
@@ -319,16 +340,9 @@ Remember: Every person has their own unique style - help them discover and embra
     async def end_audio_input(self) -> bool:
         """End audio input stream"""
         try:
-            if hasattr(self, '_audio_started'):
-                await self.send_event({
-                    "event": {
-                        "contentEnd": {
-                            "promptName": self.prompt_name,
-                            "contentName": self.audio_content_name
-                        }
-                    }
-                })
-                delattr(self, '_audio_started')
+            if self._audio_started:
+                await self._send_bytes(AUDIO_CONTENT_END_EVENT)
+                self._audio_started = False
                 logger.info("Audio input ended")
             return True
             
@@ -336,6 +350,23 @@ Remember: Every person has their own unique style - help them discover and embra
             logger.error(f"Failed to end audio input: {str(e)}")
             return False
     
+    async def _put_audio(self, item: Dict[str, Any], timeout: float = 5.0):
+        """Queue an audio chunk, waiting for room so no part of a reply is lost
+        
+        Only gives up, and drops the chunk, if nothing consumes audio for timeout
+        seconds, so an abandoned session can't stall the response reader.
+        """
+        try:
+            # Usual case: room in the queue, no task or scheduler round-trip
+            self.audio_queue.put_nowait(item)
+            return
+        except asyncio.QueueFull:
+            pass
+        try:
+            await asyncio.wait_for(self.audio_queue.put(item), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Audio queue full for %.0fs, dropping an audio chunk", timeout)
+    
     async def _process_responses(self):
         """Process responses from Nova Sonic"""
         try:
@@ -346,27 +377,26 @@ Remember: Every person has their own unique style - help them discover and embra
                 result = await output[1].receive()
                 
                 if result.value and result.value.bytes_:
-                    response_data = result.value.bytes_.decode('utf-8')
-                    json_data = json.loads(response_data)
+                    json_data = json_loads(result.value.bytes_)
                     
                     if 'event' in json_data:
                         # Handle text output
                         if 'textOutput' in json_data['event']:
                             text = json_data['event']['textOutput']['content']
-                            await self.response_queue.put({
+                            self.response_queue.put_nowait({
                                 'type': 'text',
                                 'content': text,
-                                'timestamp': datetime.utcnow().isoformat()
+                                'timestamp': time.time()
                             })
                         
                         # Handle audio output
                         elif 'audioOutput' in json_data['event']:
-                            audio_content = json_data['event']['audioOutput']['content']
-                            audio_bytes = base64.b64decode(audio_content)
-                            await self.audio_queue.put({
+                            # Queued still base64-encoded; consumers decode
+                            # when they take it, off the stream reader's path
+                            await self._put_audio({
                                 'type': 'audio',
-                                'content': audio_bytes,
-                                'timestamp': datetime.utcnow().isoformat()
+                                'content': json_data['event']['audioOutput']['content'],
+                                'timestamp': time.time()
                             })
                         
                         # Handle content events
@@ -395,13 +425,45 @@ Remember: Every person has their own unique style - help them discover and embra
         """Get the next audio response from Nova Sonic"""
         try:
             audio_response = await asyncio.wait_for(self.audio_queue.get(), timeout=timeout)
-            return audio_response
+            return dict(audio_response, content=binascii.a2b_base64(audio_response['content']))
         except asyncio.TimeoutError:
             return None
         except Exception as e:
             logger.error(f"Error getting audio response: {str(e)}")
             return None
     
+    async def _audio_reply_chunks(self, timeout: float, idle: float):
+        """Yield the decoded chunks of the next audio reply as they arrive
+        
+        Waits up to timeout for the first chunk, then stops once no new chunk
+        arrives for idle seconds.
+        """
+        wait = timeout
+        while True:
+            try:
+                audio_response = await asyncio.wait_for(self.audio_queue.get(), timeout=wait)
+            except asyncio.TimeoutError:
+                return
+            yield binascii.a2b_base64(audio_response['content'])
+            wait = idle
+    
+    async def get_audio_reply(self, timeout: float = 10.0, idle: float = 1.0) -> Optional[bytes]:
+        """Collect the whole next audio reply as one PCM buffer, or None if there is none"""
+        chunks = [chunk async for chunk in self._audio_reply_chunks(timeout, idle)]
+        return b''.join(chunks) if chunks else None
+    
+    async def write_audio_response_to(self, path: str, timeout: float = 10.0, idle: float = 1.0) -> int:
+        """Write the next audio reply to a file chunk by chunk as it arrives
+        
+        Returns the number of bytes written.
+        """
+        written = 0
+        # Unbuffered: each decoded chunk goes to the file in one write() syscall
+        with open(path, 'wb', buffering=0) as f:
+            async for chunk in self._audio_reply_chunks(timeout, idle):
+                written += f.write(chunk)
+        return written
+    
     async def end_session(self):
         """End the Nova Sonic session"""
         try:
@@ -414,20 +476,10 @@ Remember: Every person has their own unique style - help them discover and embra
             await self.end_audio_input()
             
             # Send prompt end
-            await self.send_event({
-                "event": {
-                    "promptEnd": {
-                        "promptName": self.prompt_name
-                    }
-                }
-            })
+            await self._send_bytes(PROMPT_END_EVENT)
             
             # Send session end
-            await self.send_event({
-                "event": {
-                    "sessionEnd": {}
-                }
-            })
+            await self._send_bytes(SESSION_END_EVENT)
             
             # Close stream
             await self.stream.input_stream.close()
@@ -473,15 +525,13 @@ async def test_nova_sonic_style_generator():
             if response:
                 print(f"🎙️ EssenceMirror: {response['content']}")
             
-            # Check for audio response
-            audio_response = await generator.get_audio_response(timeout=5.0)
-            if audio_response:
-                # Save audio for testing
-                timestamp = datetime.now().strftime('%H%M%S')
-                audio_file = f"style_response_{timestamp}.wav"
-                with open(audio_file, 'wb') as f:
-                    f.write(audio_response['content'])
+            # Save audio for testing, streamed to disk as it arrives
+            timestamp = time.strftime('%H%M%S')
+            audio_file = f"style_response_{timestamp}.wav"
+            if await generator.write_audio_response_to(audio_file, timeout=5.0):
                 print(f"🎵 Audio saved: {audio_file}")
+            else:
+                os.remove(audio_file)
         
         # End session
         await generator.end_session()
@@ -6,77 +6,130 @@ Integrates image-inspired video generation using Nova Reel
 import streamlit as st
 import os
 import sys
-import json
 import time
+import random
 import uuid
 import tempfile
 from datetime import datetime
 from PIL import Image
 import logging
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from essence_mirror_core import file_digest, get_executor
 
-# Add the infrastructure directory to the path to import our generators
-sys.path.append('/Users/kirubelaklilu/Documents/EssenceMirror/essence-mirror-infrastructure')
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Configuration
+S3_BUCKET = "essencemirror-user-uploads"
+
+# Video focus choices and the style keywords each one adds to the prompt
+STYLE_FOCUS_OPTIONS = {
+    "lifestyle": "🌟 Complete Lifestyle",
+    "wardrobe": "👗 Fashion & Wardrobe",
+    "interior": "🏠 Home & Interior",
+    "travel": "✈️ Travel & Adventure"
+}
+_STYLE_FOCUS_KEYS = tuple(STYLE_FOCUS_OPTIONS)
+_style_focus_label = STYLE_FOCUS_OPTIONS.__getitem__  # selectbox format_func
+
+# Status polling backoff, in seconds: 2, 3, 4.5, ... capped at a minute
+POLL_BASE_DELAY = 2
+POLL_BACKOFF = 1.5
+POLL_MAX_DELAY = 60
+POLL_MAX_FAILURES = 3  # failed status calls in a row before giving up
+VIDEO_ESTIMATE_SECONDS = 180  # the "2-3 minutes" shown to the user
 
-try:
+FOCUS_ENHANCEMENTS = {
+    "wardrobe": ["fashion-forward", "stylish clothing", "trendy outfits"],
+    "interior": ["home decor", "interior design", "living space aesthetics"],
+    "travel": ["wanderlust", "travel destinations", "adventure scenes"],
+    "lifestyle": ["daily life", "personal moments", "lifestyle photography"]
+}
+
+# The video generators live in the infrastructure package. Import them once per
+# process, on first use; a failed import isn't cached, so it is retried.
+@st.cache_resource(show_spinner=False)
+def _load_generators():
+    # Infrastructure checkout for local development, opt-in via environment
+    infra_path = os.environ.get('ESSENCE_INFRA_PATH')
+    if infra_path and infra_path not in sys.path:
+        sys.path.append(infra_path)
     from image_inspired_generator import (
-        create_image_inspired_prompt, 
-        simulate_style_analysis, 
-        extract_style_elements,
-        analyze_image_basic
+        create_image_inspired_prompt,
+        simulate_style_analysis,
+        extract_style_elements
     )
     from nova_reel_generator import NovaReelGenerator
-except ImportError as e:
-    st.error(f"Error importing video generation modules: {str(e)}")
-    st.info("Make sure the infrastructure components are properly set up.")
+    return SimpleNamespace(
+        create_image_inspired_prompt=create_image_inspired_prompt,
+        simulate_style_analysis=simulate_style_analysis,
+        extract_style_elements=extract_style_elements,
+        NovaReelGenerator=NovaReelGenerator
+    )
 
-# Configure logging
-logger = logging.getLogger(__name__)
+# One Nova Reel generator (and its boto3 clients) per process, shared by
+# every session and status poll
+@st.cache_resource(show_spinner=False)
+def _get_nova_reel():
+    return _load_generators().NovaReelGenerator(s3_bucket=S3_BUCKET)
 
-# Configuration
-S3_BUCKET = "essencemirror-user-uploads"
+@st.cache_data(ttl=3600, show_spinner=False)
+def _simulated_style_analysis():
+    return _load_generators().simulate_style_analysis()
+
+# Keyed on the image's digest rather than its temp path, which differs per
+# upload; the leading underscore keeps the path out of the cache key
+@st.cache_data(ttl=24 * 60 * 60, show_spinner=False)
+def _image_inspired_prompt(image_digest, user_prompt, style_elements, _image_path):
+    return _load_generators().create_image_inspired_prompt(_image_path, user_prompt, style_elements)
 
 def save_uploaded_file_temporarily(uploaded_file):
     """Save uploaded file to a temporary location for processing"""
     try:
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{uploaded_file.name.split('.')[-1]}") as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
+        # Create a temporary file; the prompt builder takes a path. Write from
+        # the upload's buffer directly rather than a getvalue() copy of it.
+        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{uploaded_file.name.split('.')[-1]}") as tmp_file, \
+                uploaded_file.getbuffer() as view:
+            tmp_file.write(view)
             return tmp_file.name
     except Exception as e:
         logger.error(f"Error saving temporary file: {str(e)}")
         return None
 
-def generate_style_video(image_path, user_prompt=None, style_focus="lifestyle", duration=6):
-    """Generate a style video using the image-inspired approach"""
+def build_video_prompt(image_path, user_prompt=None, style_focus="lifestyle", image_digest=None):
+    """Build the image-inspired video prompt; returns (final_prompt, image_analysis)
+    
+    Uses Streamlit's caches, so call it on the script thread. Passing the
+    image's content digest lets the image analysis be reused when the same
+    photo is submitted again with the same options.
+    """
+    # Simulate style analysis (in production, this would come from the actual analysis)
+    style_analysis = _simulated_style_analysis()
+    
+    # Extract style elements
+    style_elements = _load_generators().extract_style_elements(style_analysis)
+    
+    # Enhance style elements based on focus
+    if style_focus in FOCUS_ENHANCEMENTS:
+        style_elements.extend(FOCUS_ENHANCEMENTS[style_focus])
+    
+    # Create image-inspired prompt
+    if image_digest:
+        return _image_inspired_prompt(image_digest, user_prompt, style_elements, image_path)
+    return _load_generators().create_image_inspired_prompt(image_path, user_prompt, style_elements)
+
+def submit_video_job(nova_reel, image_path, user_prompt, final_prompt, image_analysis,
+                     style_focus="lifestyle", duration=6):
+    """Start a Nova Reel job for a prepared prompt
+    
+    Takes only plain values and the generator instance, so it is safe to run
+    on a worker thread.
+    """
     try:
-        # Simulate style analysis (in production, this would come from the actual analysis)
-        style_analysis = simulate_style_analysis()
-        
-        # Extract style elements
-        style_elements = extract_style_elements(style_analysis)
-        
-        # Enhance style elements based on focus
-        focus_enhancements = {
-            "wardrobe": ["fashion-forward", "stylish clothing", "trendy outfits"],
-            "interior": ["home decor", "interior design", "living space aesthetics"],
-            "travel": ["wanderlust", "travel destinations", "adventure scenes"],
-            "lifestyle": ["daily life", "personal moments", "lifestyle photography"]
-        }
-        
-        if style_focus in focus_enhancements:
-            style_elements.extend(focus_enhancements[style_focus])
-        
-        # Create image-inspired prompt
-        final_prompt, image_analysis = create_image_inspired_prompt(
-            image_path, user_prompt, style_elements
-        )
-        
         # Create a unique job ID
         job_id = str(uuid.uuid4())
         
-        # Initialize the Nova Reel Generator
-        nova_reel = NovaReelGenerator(s3_bucket=S3_BUCKET)
-        
         logger.info(f"Generating style video with prompt: {final_prompt}")
         
         # Generate video using text-to-video with the image-inspired prompt
@@ -106,11 +159,110 @@ def generate_style_video(image_path, user_prompt=None, style_focus="lifestyle",
         logger.error(f"Error generating style video: {str(e)}")
         raise
 
+def generate_style_video(image_path, user_prompt=None, style_focus="lifestyle", duration=6, image_digest=None):
+    """Generate a style video using the image-inspired approach"""
+    final_prompt, image_analysis = build_video_prompt(image_path, user_prompt, style_focus, image_digest)
+    return submit_video_job(
+        _get_nova_reel(), image_path, user_prompt, final_prompt, image_analysis,
+        style_focus, duration
+    )
+
+def _start_video_job(nova_reel, image_path, user_prompt, final_prompt, image_analysis, style_focus, duration):
+    """Start a video job on a worker thread, then remove the temporary image"""
+    try:
+        return submit_video_job(
+            nova_reel, image_path, user_prompt, final_prompt, image_analysis,
+            style_focus, duration
+        )
+    finally:
+        try:
+            os.unlink(image_path)
+        except OSError:
+            pass
+
+@st.fragment(run_every=2)
+def _await_video_job_start():
+    """Wait for the background job start without blocking the rest of the tab"""
+    if st.session_state.video_job_future.done():
+        # Rerun the whole app so both columns pick up the new job
+        st.rerun()
+    st.caption("🎬 Preparing your video job...")
+
+def _poll_delay(attempt):
+    """Seconds until the next status check: capped exponential backoff plus jitter"""
+    return min(POLL_MAX_DELAY, POLL_BASE_DELAY * POLL_BACKOFF ** attempt) + random.uniform(0, 1)
+
+@dataclass
+class VideoPollSession:
+    """Polling state for one video job, kept in st.session_state.video_poll across reruns"""
+    video_job_id: str
+    attempt: int = 0
+    started_at: float = field(default_factory=time.time)
+    next_poll_at: float = 0.0
+    consecutive_failures: int = 0
+    
+    def __post_init__(self):
+        if not self.next_poll_at:
+            self.next_poll_at = self.started_at + _poll_delay(0)
+    
+    def due(self, now):
+        return now >= self.next_poll_at
+    
+    def check(self, job_info):
+        """Check the job's status and schedule the next check"""
+        now = time.time()
+        job_info = check_video_status(job_info)
+        if job_info["status"] == "ERROR":
+            # Back off harder while the status call itself is failing
+            self.consecutive_failures += 1
+        else:
+            self.consecutive_failures = 0
+            self.attempt += 1
+        self.next_poll_at = now + _poll_delay(self.attempt + self.consecutive_failures)
+        return job_info
+    
+    @property
+    def gave_up(self):
+        return self.consecutive_failures >= POLL_MAX_FAILURES
+
+@st.fragment(run_every=2)
+def _poll_video_status():
+    """Check the running job when its backoff window has passed; rerun the app once it ends"""
+    poll = st.session_state.video_poll
+    if poll is None:
+        poll = st.session_state.video_poll = VideoPollSession(st.session_state.video_job["videoJobId"])
+    if not poll.due(time.time()):
+        return
+    
+    updated_job = poll.check(st.session_state.video_job)
+    st.session_state.video_job = updated_job
+    
+    status = updated_job["status"]
+    if status == "VIDEO_GENERATION_IN_PROGRESS" or (status == "ERROR" and not poll.gave_up):
+        return
+    
+    st.session_state.video_poll = None
+    st.session_state.video_generation_in_progress = False
+    if status == "VIDEO_GENERATED":
+        st.session_state.generated_video_url = updated_job["videoUrl"]
+    elif status == "VIDEO_GENERATION_FAILED":
+        st.session_state.video_notice = f"Video generation failed: {updated_job.get('errorMessage', 'Unknown error')}"
+    else:
+        st.session_state.video_notice = f"Error: {updated_job.get('errorMessage', 'Unknown error')}"
+    # Rerun the whole app so both columns show the result
+    st.rerun()
+
+@st.fragment(run_every=2)
+def _video_progress():
+    """Progress bar for the running job, driven by time elapsed against the estimate"""
+    poll = st.session_state.video_poll
+    elapsed = time.time() - poll.started_at if poll else 0.0
+    st.progress(min(0.99, elapsed / VIDEO_ESTIMATE_SECONDS), text=f"{int(elapsed)}s elapsed")
+
 def check_video_status(job_info):
     """Check the status of a video generation job"""
     try:
-        # Initialize the Nova Reel Generator
-        nova_reel = NovaReelGenerator(s3_bucket=S3_BUCKET)
+        nova_reel = _get_nova_reel()
         
         # Check the status of the video generation job
         video_job_id = job_info["videoJobId"]
@@ -156,6 +308,13 @@ def render_style_reel_tab(session_id, analysis_complete):
     st.markdown("### 🎬 Style in Motion (Beta)")
     st.markdown("Transform your style into dynamic videos using AI! Upload an image and watch your personal aesthetic come to life.")
     
+    try:
+        _load_generators()
+    except ImportError as e:
+        st.error(f"Error importing video generation modules: {str(e)}")
+        st.info("Make sure the infrastructure components are properly set up.")
+        return
+    
     # Initialize session state for video generation
     if 'video_job' not in st.session_state:
         st.session_state.video_job = None
@@ -163,6 +322,27 @@ def render_style_reel_tab(session_id, analysis_complete):
         st.session_state.video_generation_in_progress = False
     if 'generated_video_url' not in st.session_state:
         st.session_state.generated_video_url = None
+    if 'video_job_future' not in st.session_state:
+        st.session_state.video_job_future = None
+    if 'video_poll' not in st.session_state:
+        st.session_state.video_poll = None
+    
+    # Outcome of a status poll that ended the job, shown once
+    notice = st.session_state.pop('video_notice', None)
+    if notice:
+        st.error(notice)
+    
+    # Pick up a job start that finished in the background
+    future = st.session_state.video_job_future
+    if future is not None and future.done():
+        st.session_state.video_job_future = None
+        try:
+            st.session_state.video_job = future.result()
+            st.session_state.video_poll = VideoPollSession(st.session_state.video_job["videoJobId"])
+            st.success("🎉 Video generation started! Please wait while we create your style video.")
+        except Exception as e:
+            st.session_state.video_generation_in_progress = False
+            st.error(f"Error starting video generation: {str(e)}")
     
     # Two columns layout
     col1, col2 = st.columns([1, 1])
@@ -186,17 +366,10 @@ def render_style_reel_tab(session_id, analysis_complete):
             st.markdown("#### 🎯 Video Options")
             
             # Style focus selection
-            style_focus_options = {
-                "lifestyle": "🌟 Complete Lifestyle",
-                "wardrobe": "👗 Fashion & Wardrobe",
-                "interior": "🏠 Home & Interior",
-                "travel": "✈️ Travel & Adventure"
-            }
-            
             selected_focus = st.selectbox(
                 "Video Focus:",
-                options=list(style_focus_options.keys()),
-                format_func=lambda x: style_focus_options[x],
+                options=_STYLE_FOCUS_KEYS,
+                format_func=_style_focus_label,
                 index=0,
                 key="video_style_focus"
             )
@@ -226,58 +399,46 @@ def render_style_reel_tab(session_id, analysis_complete):
                     temp_image_path = save_uploaded_file_temporarily(video_image)
                     
                     if temp_image_path:
+                        prompt_text = user_prompt if user_prompt.strip() else None
                         try:
-                            with st.spinner("🎬 Creating your style video... This may take 2-3 minutes."):
-                                # Generate the video
-                                job_info = generate_style_video(
-                                    image_path=temp_image_path,
-                                    user_prompt=user_prompt if user_prompt.strip() else None,
-                                    style_focus=selected_focus,
-                                    duration=duration
-                                )
-                                
-                                # Store job info in session state
-                                st.session_state.video_job = job_info
-                                st.session_state.video_generation_in_progress = True
-                                
-                                st.success("🎉 Video generation started! Please wait while we create your style video.")
-                                st.rerun()
-                                
+                            # Cached Streamlit calls stay on the script thread;
+                            # the worker only gets plain values
+                            final_prompt, image_analysis = build_video_prompt(
+                                temp_image_path, prompt_text, selected_focus,
+                                file_digest(video_image)
+                            )
+                            nova_reel = _get_nova_reel()
                         except Exception as e:
-                            st.error(f"Error starting video generation: {str(e)}")
-                        finally:
-                            # Clean up temporary file
-                            try:
-                                os.unlink(temp_image_path)
-                            except:
-                                pass
+                            os.unlink(temp_image_path)
+                            st.error(f"Error preparing video generation: {str(e)}")
+                        else:
+                            # Start the job in the background so the tab stays responsive
+                            st.session_state.video_job_future = get_executor().submit(
+                                _start_video_job,
+                                nova_reel,
+                                temp_image_path,
+                                prompt_text,
+                                final_prompt,
+                                image_analysis,
+                                selected_focus,
+                                duration
+                            )
+                            st.session_state.video_generation_in_progress = True
+                            st.rerun()
                     else:
                         st.error("Error processing uploaded image. Please try again.")
             else:
                 st.info("🎬 Video generation in progress... Please wait.")
                 
+                if st.session_state.video_job_future is not None:
+                    _await_video_job_start()
+                
                 # Show progress and check status
                 if st.session_state.video_job:
-                    # Status checking
-                    if st.button("🔄 Check Status", key="check_video_status"):
-                        with st.spinner("Checking video generation status..."):
-                            updated_job = check_video_status(st.session_state.video_job)
-                            st.session_state.video_job = updated_job
-                            
-                            if updated_job["status"] == "VIDEO_GENERATED":
-                                st.session_state.video_generation_in_progress = False
-                                st.session_state.generated_video_url = updated_job["videoUrl"]
-                                st.success("🎉 Your style video is ready!")
-                                st.rerun()
-                            elif updated_job["status"] == "VIDEO_GENERATION_FAILED":
-                                st.session_state.video_generation_in_progress = False
-                                st.error(f"Video generation failed: {updated_job.get('errorMessage', 'Unknown error')}")
-                            elif updated_job["status"] == "ERROR":
-                                st.session_state.video_generation_in_progress = False
-                                st.error(f"Error: {updated_job.get('errorMessage', 'Unknown error')}")
-                    
-                    # Auto-refresh every 15 seconds
-                    time.sleep(1)  # Small delay to prevent too frequent updates
+                    # Status is polled automatically; this just checks now
+                    if st.button("🔄 Check Status", key="check_video_status") and st.session_state.video_poll:
+                        st.session_state.video_poll.next_poll_at = 0.0
+                    _poll_video_status()
     
     with col2:
         st.markdown("#### 🎥 Generated Style Video")
@@ -292,7 +453,7 @@ def render_style_reel_tab(session_id, analysis_complete):
                 
                 # Video details
                 with st.expander("📋 Video Details", expanded=False):
-                    st.write(f"**Style Focus:** {style_focus_options.get(job.get('styleFocus', 'lifestyle'), 'Lifestyle')}")
+                    st.write(f"**Style Focus:** {STYLE_FOCUS_OPTIONS.get(job.get('styleFocus', 'lifestyle'), 'Lifestyle')}")
                     st.write(f"**Duration:** {job.get('duration', 6)} seconds")
                     if job.get('originalPrompt'):
                         st.write(f"**Your Prompt:** {job['originalPrompt']}")
@@ -317,6 +478,8 @@ def render_style_reel_tab(session_id, analysis_complete):
                 if st.button("🔄 Generate New", key="generate_new_video"):
                     # Reset video generation state
                     st.session_state.video_job = None
+                    st.session_state.video_job_future = None
+                    st.session_state.video_poll = None
                     st.session_state.video_generation_in_progress = False
                     st.session_state.generated_video_url = None
                     st.rerun()
@@ -342,7 +505,7 @@ def render_style_reel_tab(session_id, analysis_complete):
                 
                 # Show what's being generated
                 st.markdown("**🎯 Video Details:**")
-                st.write(f"• **Focus:** {style_focus_options.get(job.get('styleFocus', 'lifestyle'), 'Lifestyle')}")
+                st.write(f"• **Focus:** {STYLE_FOCUS_OPTIONS.get(job.get('styleFocus', 'lifestyle'), 'Lifestyle')}")
                 st.write(f"• **Duration:** {job.get('duration', 6)} seconds")
                 if job.get('originalPrompt'):
                     st.write(f"• **Your Input:** {job['originalPrompt']}")
@@ -350,11 +513,8 @@ def render_style_reel_tab(session_id, analysis_complete):
                 # Estimated time
                 st.markdown("⏱️ **Estimated Time:** 2-3 minutes")
                 
-                # Progress bar (simulated)
-                progress_bar = st.progress(0)
-                for i in range(100):
-                    time.sleep(0.01)
-                    progress_bar.progress(i + 1)
+                # Progress against the estimate, refreshed without blocking the script
+                _video_progress()
         
         else:
             # Instructions